@@ -1,4 +1,5 @@
 import ctypes
+import numpy as np
 
 # 'DMX '
 DMX_MAGIC = 0x204D5844
@@ -25,4 +26,53 @@ class DmxValue(ctypes.Structure):
     _fields_ = [
         ('channel', ctypes.c_uint16),
         ('value', ctypes.c_uint8)
-    ]
\ No newline at end of file
+    ]
+
+
+# numpy layouts of the structures above, with the same native byte order and padding
+HEADER_DTYPE = np.dtype([('magic', '=u4'), ('padding', '=u2'), ('universe', '=u2'), ('elementCount', '=u4'), ('duration', '=u4')], align=True)
+ELEMENT_DTYPE = np.dtype([('time', '=u4'), ('valueAmount', '=u2')], align=True)
+VALUE_DTYPE = np.dtype([('channel', '=u2'), ('value', 'u1')], align=True)
+
+
+def _wrapped(values: np.ndarray, dtype: str) -> np.ndarray:
+    # wrap like the ctypes fields do
+    return np.asarray(values).astype(np.int64).astype(dtype)
+
+
+def encode_header(universe: int, element_count: int, duration: int) -> bytes:
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = DMX_MAGIC
+    header['universe'] = universe
+    header['elementCount'] = element_count
+    header['duration'] = duration
+    return header.tobytes()
+
+
+def encode_elements(times: np.ndarray, value_amounts: np.ndarray, channels: np.ndarray, values: np.ndarray) -> bytes:
+    """
+    Encode elements with times in milliseconds, each followed by its value_amounts[i]
+    entries of the flat channels and values arrays.
+    """
+    value_amounts = np.asarray(value_amounts, dtype=np.int64)
+    element_sizes = ELEMENT_DTYPE.itemsize + VALUE_DTYPE.itemsize * value_amounts
+    element_offsets = np.cumsum(element_sizes) - element_sizes
+    target = np.zeros(int(np.sum(element_sizes)), dtype=np.uint8)
+
+    elements = np.zeros(len(value_amounts), dtype=ELEMENT_DTYPE)
+    elements['time'] = _wrapped(times, 'u4')
+    elements['valueAmount'] = _wrapped(value_amounts, 'u2')
+    element_bytes = elements.view(np.uint8).reshape(-1, ELEMENT_DTYPE.itemsize)
+    target[element_offsets[:, np.newaxis] + np.arange(ELEMENT_DTYPE.itemsize)] = element_bytes
+
+    dmx_values = np.zeros(len(channels), dtype=VALUE_DTYPE)
+    dmx_values['channel'] = _wrapped(channels, 'u2')
+    dmx_values['value'] = _wrapped(values, 'u1')
+    value_bytes = dmx_values.view(np.uint8).reshape(-1, VALUE_DTYPE.itemsize)
+    # the k-th value of an element sits right after the element and its first k values
+    owners = np.repeat(np.arange(len(value_amounts)), value_amounts)
+    positions = np.arange(len(owners)) - np.repeat(np.cumsum(value_amounts) - value_amounts, value_amounts)
+    value_offsets = element_offsets[owners] + ELEMENT_DTYPE.itemsize + VALUE_DTYPE.itemsize * positions
+    target[value_offsets[:, np.newaxis] + np.arange(VALUE_DTYPE.itemsize)] = value_bytes
+
+    return target.tobytes()
@@ -1,11 +1,14 @@
+from __future__ import annotations
 from dmx.frame import Frame
-from dmx.dmx import DmxHeader, DmxElement, DmxValue, DMX_MAGIC
-from typing import Callable, Dict, List
+from dmx.dmx import encode_header, encode_elements
+from typing import Callable, Dict, IO, Iterator, List, Sequence, Tuple
 from tqdm import tqdm
 import json
+import numpy as np
 from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import cpu_count
 from math import ceil
+from util import ordered_bounded_map
 
 
 class FillFrame:
@@ -20,9 +23,150 @@ class FillFrame:
         return frame
 
 
+ChangeElements = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class UniverseDiffer:
+
+    UNIVERSE_SIZE: int = 512
+
+    _state: np.ndarray
+    _known: np.ndarray
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._state = np.zeros(self.UNIVERSE_SIZE, dtype=np.uint8)
+        self._known = np.zeros(self.UNIVERSE_SIZE, dtype=bool)
+
+    def diff(self, frames: Sequence[Frame]) -> ChangeElements:
+        """
+        Return the change elements (ts, value amounts, channels, values) of consecutive
+        frames, continuing from the channel state left by the previous call.
+        """
+        value_counts = np.fromiter((len(frame.channel_values) for frame in frames), dtype=np.int64, count=len(frames))
+        pairs = np.array([value for frame in frames for value in frame.channel_values], dtype=np.int64).reshape(-1, 2)
+        rows = np.repeat(np.arange(len(frames)), value_counts)
+        channels, values = pairs[:, 0], pairs[:, 1]
+        if np.any((channels < 1) | (channels > self.UNIVERSE_SIZE)):
+            raise ValueError(f"DMX channels must be in the range [1, {self.UNIVERSE_SIZE}]")
+        if np.any((values < 0) | (values > 255)):
+            raise ValueError("DMX values must be in the range [0, 255]")
+
+        # row 0 holds the state carried over from the previous frames
+        universe = np.zeros((len(frames) + 1, self.UNIVERSE_SIZE), dtype=np.uint8)
+        is_set = np.zeros(universe.shape, dtype=bool)
+        universe[0], is_set[0] = self._state, self._known
+        universe[rows + 1, channels - 1] = values
+        is_set[rows + 1, channels - 1] = True
+
+        # forward fill every channel from the last frame that set it
+        source_rows = np.maximum.accumulate(np.where(is_set, np.arange(len(universe))[:, np.newaxis], 0), axis=0)
+        state = np.take_along_axis(universe, source_rows, axis=0)
+        known = np.logical_or.accumulate(is_set, axis=0)
+
+        changed = known[1:] & (~known[:-1] | (np.diff(state.astype(np.int16), axis=0) != 0))
+        self._state, self._known = state[-1], known[-1]
+
+        changed_rows, changed_channels = np.nonzero(changed)
+        element_rows, value_amounts = np.unique(changed_rows, return_counts=True)
+        ts = np.array([frames[row].t for row in element_rows], dtype=float)
+        return ts, value_amounts, changed_channels + 1, state[changed_rows + 1, changed_channels].astype(np.int64)
+
+
+class DmxWriter:
+
+    MILLISECONDS_PER_SECOND = 1000
+    FRAMES_PER_CHUNK: int = 256
+
+    _file: IO
+    _universe: int
+    _duration: int
+    _save_as_binary: bool
+    _element_count: int
+    _differ: UniverseDiffer
+    _pending_frames: List[Frame]
+
+    def __init__(self, dmx_filename: str, universe: int, duration: int, save_as_binary: bool):
+        self._universe = universe
+        self._duration = duration
+        self._save_as_binary = save_as_binary
+        self._element_count = 0
+        self._differ = UniverseDiffer()
+        self._pending_frames = []
+        if self._save_as_binary:
+            self._file = open(dmx_filename, 'wb')
+            # the element count is only known at the end, so the header is written again on close
+            self._file.write(self._header())
+        else:
+            self._file = open(dmx_filename, 'w')
+            self._file.write("{")
+
+    def __enter__(self) -> DmxWriter:
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _header(self) -> bytes:
+        return encode_header(self._universe, self._element_count, self._duration)
+
+    def start_animation(self):
+        self._flush_frames()
+        self._differ.reset()
+
+    def add_frame(self, frame: Frame):
+        # frames are diffed in chunks; the differ carries the channel state between them
+        self._pending_frames.append(frame)
+        if len(self._pending_frames) >= self.FRAMES_PER_CHUNK:
+            self._flush_frames()
+
+    def _flush_frames(self):
+        if self._pending_frames:
+            self.write_elements(*self._differ.diff(self._pending_frames))
+            self._pending_frames = []
+
+    def write_element(self, t: float, values: Dict[int, int]):
+        self.write_elements(
+            np.array([t]),
+            np.array([len(values)]),
+            np.fromiter(values.keys(), dtype=np.int64, count=len(values)),
+            np.fromiter(values.values(), dtype=np.int64, count=len(values))
+        )
+
+    def write_elements(self, ts: np.ndarray, value_amounts: np.ndarray, channels: np.ndarray, values: np.ndarray):
+        if self._save_as_binary:
+            times = (np.asarray(ts, dtype=float) * self.MILLISECONDS_PER_SECOND).astype(np.int64)
+            self._file.write(encode_elements(times, value_amounts, channels, values))
+            self._element_count += len(value_amounts)
+            return
+
+        # entries of the object json.dump would write for the whole channel dict
+        ends = np.cumsum(value_amounts)
+        for t, start, end in zip(ts, ends - value_amounts, ends):
+            if self._element_count > 0:
+                self._file.write(", ")
+            entry = {int(channel): int(value) for channel, value in zip(channels[start:end], values[start:end])}
+            self._file.write(json.dumps({float(t): entry})[1:-1])
+            self._element_count += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_frames()
+        if self._save_as_binary:
+            self._file.seek(0)
+            self._file.write(self._header())
+        else:
+            self._file.write("}")
+        self._file.close()
+
+
 class DmxFactory:
 
     MILLISECONDS_PER_SECOND = 1000
+    FRAME_BATCH_SIZE_FACTOR: int = 2
 
     _fps: float
     _durations: List[float]
@@ -31,6 +175,7 @@ class DmxFactory:
     _dmx_filename: str
     _universe: int = 0
     _save_as_binary: bool
+    _streaming: bool
 
     def __init__(
         self, 
@@ -40,7 +185,8 @@ class DmxFactory:
         factory_functions: List[Callable[[Frame], None]],
         dmx_filename: str,
         universe: int = 0,
-        save_as_binary: bool = True
+        save_as_binary: bool = True,
+        streaming: bool = False
     ):
         self._fps = fps
         self._durations = durations if isinstance(durations, list) else [durations]
@@ -49,6 +195,7 @@ class DmxFactory:
         self._dmx_filename = dmx_filename
         self._universe = universe
         self._save_as_binary = save_as_binary
+        self._streaming = streaming
     
     def _compute_frames(self) -> List[List[Frame]]:
         print("Computing DMX frames...")
@@ -70,63 +217,69 @@ class DmxFactory:
     def _compute_channels(self, animations: List[List[Frame]]) -> Dict[float, Dict[int, int]]:
         print("Computing DMX channels...")
         all_channels = {}
-        for animation in animations:
-            channels = {}
-            last_values = {}
-            for frame in tqdm(
-                animation, 
-                total=len(animation),
-                desc=f"Animation {animations.index(animation) + 1}/{len(animations)}"
+        differ = UniverseDiffer()
+        for animation_idx, animation in enumerate(animations):
+            differ.reset()
+            for chunk_start in tqdm(
+                range(0, len(animation), DmxWriter.FRAMES_PER_CHUNK),
+                desc=f"Animation {animation_idx + 1}/{len(animations)}"
             ):
-                new_values = {
-                    index: value for index, value in frame.channel_values
-                }
-                diff = dict(set(new_values.items()) - set(last_values.items()))
-                if len(diff) > 0:
-                    channels[frame.t] = diff
-                    last_values = new_values
-            all_channels.update(channels)
+                ts, value_amounts, channels, values = differ.diff(animation[chunk_start:chunk_start + DmxWriter.FRAMES_PER_CHUNK])
+                ends = np.cumsum(value_amounts)
+                for t, start, end in zip(ts.tolist(), (ends - value_amounts).tolist(), ends.tolist()):
+                    all_channels[t] = dict(zip(channels[start:end].tolist(), values[start:end].tolist()))
         return all_channels
     
-    def _write_binary_file(self, channels: Dict[float, Dict[int, int]]):
-        target = bytearray()
-        header = DmxHeader(
-            magic=DMX_MAGIC,
-            padding=0,
-            universe=self._universe,
-            elementCount=len(channels),
-            duration=self.MILLISECONDS_PER_SECOND * len(channels) // self._fps
+    def _iter_frames(self, animation_idx: int) -> Iterator[Frame]:
+        duration, start_t = self._durations[animation_idx], self._start_ts[animation_idx]
+        frame_count = ceil(self._fps * duration)
+        empty_frames = (
+            Frame(start_t, start_t + (i / self._fps), self._fps, duration)
+            for i in range(frame_count)
         )
-        target.extend(bytearray(header))
-        for t, values in channels.items():
-            element = DmxElement(
-                time=int(t * self.MILLISECONDS_PER_SECOND),
-                valueAmount=len(values)
+        max_workers = cpu_count() - 1
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from tqdm(
+                ordered_bounded_map(
+                    executor, FillFrame(self._factory_functions[animation_idx]), empty_frames,
+                    window=self.FRAME_BATCH_SIZE_FACTOR * max_workers
+                ),
+                total=frame_count,
+                desc=f"Animation {animation_idx + 1}/{len(self._durations)}"
             )
-            target.extend(bytearray(element))
-            for channel, value in values.items():
-                dmx_value = DmxValue(
-                    channel=channel,
-                    value=value
-                )
-                target.extend(bytearray(dmx_value))
-        with open(self._dmx_filename, 'wb') as file:
-            file.write(target)
-
-    def _write_json_file(self, channels: Dict[float, Dict[int, int]]):
-        with open(self._dmx_filename, 'w') as file:
-            json.dump(channels, file)
+
+    def _show_duration(self) -> int:
+        # milliseconds up to the end of the last animation, on the same clock as the element times
+        end = max((start_t + duration for start_t, duration in zip(self._start_ts, self._durations)), default=0.0)
+        return int(round(end * self.MILLISECONDS_PER_SECOND))
+
+    def _create_writer(self) -> DmxWriter:
+        return DmxWriter(self._dmx_filename, self._universe, self._show_duration(), self._save_as_binary)
 
     def _write_file(self, channels: Dict[float, Dict[int, int]]):
         print("Writing DMX file...")
-        if self._save_as_binary:
-            self._write_binary_file(channels)
-        else:
-            self._write_json_file(channels)
+        with self._create_writer() as writer:
+            writer.write_elements(
+                np.fromiter(channels.keys(), dtype=float, count=len(channels)),
+                np.fromiter(map(len, channels.values()), dtype=np.int64, count=len(channels)),
+                np.fromiter((channel for values in channels.values() for channel in values.keys()), dtype=np.int64),
+                np.fromiter((value for values in channels.values() for value in values.values()), dtype=np.int64)
+            )
+
+    def _write_streamed_file(self):
+        # frames are diffed and written in order as the workers finish them
+        print("Computing and writing DMX animations...")
+        with self._create_writer() as writer:
+            for animation_idx in range(len(self._durations)):
+                writer.start_animation()
+                for frame in self._iter_frames(animation_idx):
+                    writer.add_frame(frame)
 
     def run(self):
-        animations = self._compute_frames()
-        channels = self._compute_channels(animations)
-        self._write_file(channels)
+        if self._streaming:
+            self._write_streamed_file()
+        else:
+            animations = self._compute_frames()
+            channels = self._compute_channels(animations)
+            self._write_file(channels)
         print("Done!")
-        
\ No newline at end of file
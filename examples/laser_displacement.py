@@ -5,20 +5,20 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from laser.ildx_factory import IldxFactory, Frame
 from laser.color import Color, ColorGradient
-from laser.shapes import Shape, Circle
+from laser.shapes import Shape, Circle, BatchedDisplacement
 
 import numpy as np
 
 
-class Displace:
+class Displace(BatchedDisplacement):
 
     def __init__(self, other_circle: Circle):
         self.other_circle = other_circle
 
-    def __call__(self, shape: Shape, p: np.ndarray, t: float, time: float) -> np.ndarray:
-        q = self.other_circle.nearest_point(p)
-        d = self.other_circle.signed_distance(p)
-        return p - (0.05 / d ** 2) * (q - p)
+    def __call__(self, shape: Shape, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
+        q = self.other_circle.nearest_points(points)
+        d = self.other_circle.signed_distances(points)
+        return points - (0.05 / d ** 2)[:, np.newaxis] * (q - points)
 
 
 def factory_function(frame: Frame):
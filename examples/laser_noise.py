@@ -5,19 +5,20 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from laser.ildx_factory import IldxFactory, Frame
 from laser.color import Color, ColorGradient
-from laser.shapes import Ellipse, Shape
+from laser.shapes import Ellipse, Shape, BatchedDisplacement
 from noise import Noise3D
 
 import numpy as np
 
 
-class Displace:
+class Displace(BatchedDisplacement):
 
     def __init__(self, noise: Noise3D):
         self._noise = noise
 
-    def __call__(self, shape: Shape, p: np.ndarray, s: float, t: float) -> np.ndarray:
-        return p + self._noise.get_value([p[0], p[1], t])
+    def __call__(self, shape: Shape, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
+        values = self._noise.get_values(np.column_stack([points, np.full(len(points), t)]))
+        return points + values[:, np.newaxis]
 
 
 def factory_function(frame: Frame):
@@ -1,14 +1,18 @@
-from laser.ildx_factory import IldxFactory
+from laser.ildx_factory import IldxFactory, RenderFilledFrame, initialize_worker
 from dmx.dmx_factory import DmxFactory
 from dmx.frame import Frame as DmxFrame
 from laser.frame import Frame as IldxFrame
 from laser.shapes import Shape
 from laser.color import Color
-from typing import Callable, List, Tuple
+from laser.sdf_cache import configure_sdf_cache
+from laser.sample_cache import WithSampleCacheStats
+from typing import Callable, Iterator, List, Tuple
+import numpy as np
 from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import cpu_count
 from math import ceil
 from tqdm import tqdm
+from util import ordered_bounded_map
 
 
 class FillFrame:
@@ -31,6 +35,20 @@ class FillFrame:
         return frame, dmx_frame
 
 
+class RenderFrames:
+
+    _fill_frames: FillFrame
+    _render_filled_frame: RenderFilledFrame
+
+    def __init__(self, fill_frames: FillFrame, render_filled_frame: RenderFilledFrame):
+        self._fill_frames = fill_frames
+        self._render_filled_frame = render_filled_frame
+
+    def __call__(self, frame_idx: int, frames: Tuple[IldxFrame, DmxFrame]) -> Tuple[bytes, DmxFrame]:
+        frame, dmx_frame = self._fill_frames(frames)
+        return self._render_filled_frame(frame_idx, frame), dmx_frame
+
+
 class Factory:
 
     _factory_functions: List[Callable[[IldxFrame, DmxFrame], None]]
@@ -39,6 +57,8 @@ class Factory:
     _start_ts: List[float]
     _durations: List[float]
     _point_density: float
+    _fused: bool
+    _streaming: bool
 
     _ildx_factory: IldxFactory
     _dmx_factory: DmxFactory
@@ -65,17 +85,25 @@ class Factory:
         ildx_company_name: str = "",
         ildx_projector_number: int = 0,
         dmx_universe: int = 0,
-        save_dmx_as_binary: bool = True
+        save_dmx_as_binary: bool = True,
+        sdf_cache_directory: str | None = None,
+        exclusion_zone_resolution: int | None = None,
+        fused: bool = False,
+        streaming: bool = False,
+        ildx_format_code: int = IldxFactory.FORMAT_CODE_2D_TRUE_COLOR,
+        ildx_palette: np.ndarray | None = None
     ):
         self._factory_functions = factory_functions if isinstance(factory_functions, list) else [factory_functions]
         self._start_ts = start_ts if isinstance(start_ts, list) else [start_ts]
         self._fps = fps
         self._durations = durations if isinstance(durations, list) else [durations]
         self._point_density = point_density
+        self._fused = fused
+        self._streaming = streaming
         self._ildx_factory = IldxFactory(
             fps,
-            durations,
             start_ts,
+            durations,
             [self._empty_ildx_factory_function] * len(self._factory_functions),
             ildx_filename,
             point_density,
@@ -84,7 +112,11 @@ class Factory:
             flip_y,
             ildx_frame_name,
             ildx_company_name,
-            ildx_projector_number
+            ildx_projector_number,
+            sdf_cache_directory=sdf_cache_directory,
+            exclusion_zone_resolution=exclusion_zone_resolution,
+            format_code=ildx_format_code,
+            palette=ildx_palette
         )
         self._dmx_factory = DmxFactory(
             fps,
@@ -105,7 +137,11 @@ class Factory:
                 (IldxFrame(start_t, start_t + (i / self._fps), self._fps, duration, self._point_density), DmxFrame(start_t, start_t + (i / self._fps), self._fps, duration))
                 for i in range(frame_count)
             )
-            with ProcessPoolExecutor(max_workers=cpu_count() - 1) as executor:
+            with ProcessPoolExecutor(
+                max_workers=cpu_count() - 1,
+                initializer=configure_sdf_cache,
+                initargs=(self._ildx_factory._sdf_cache_directory,)
+            ) as executor:
                 exclusion_zones = self._ildx_factory._exclusion_zones
                 show_exclusion_zones = self._ildx_factory._show_exclusion_zones
                 frames = list(tqdm(
@@ -118,13 +154,83 @@ class Factory:
             dmx_animations.append(dmx_frames)
         return ildx_animations, dmx_animations
 
-    def run(self):
-        ildx_animations, dmx_animations = self._compute_frames()
+    def _iter_rendered_frames(self, animation_idx: int) -> Iterator[Tuple[bytes, DmxFrame]]:
+        # workers render the ILDX records directly and only send back bytes and DMX frames
+        start_t, duration = self._start_ts[animation_idx], self._durations[animation_idx]
+        frame_count = ceil(self._fps * duration)
+        empty_frames = (
+            (IldxFrame(start_t, start_t + (i / self._fps), self._fps, duration, self._point_density), DmxFrame(start_t, start_t + (i / self._fps), self._fps, duration))
+            for i in range(frame_count)
+        )
+        max_workers = cpu_count() - 1
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=initialize_worker,
+            initargs=(self._ildx_factory._sdf_cache_directory, self._ildx_factory._exclusion_zones.baked_masks())
+        ) as executor:
+            render_frames = RenderFrames(
+                FillFrame(
+                    self._factory_functions[animation_idx],
+                    self._ildx_factory._exclusion_zones,
+                    self._ildx_factory._show_exclusion_zones
+                ),
+                self._ildx_factory._filled_frame_renderer(animation_idx)
+            )
+            for rendered_frames, sample_cache_stats in tqdm(
+                ordered_bounded_map(
+                    executor, WithSampleCacheStats(render_frames), range(frame_count), empty_frames,
+                    window=IldxFactory.FRAME_BATCH_SIZE_FACTOR * max_workers
+                ),
+                total=frame_count,
+                desc=f"Animation {animation_idx + 1}/{len(self._durations)}"
+            ):
+                self._ildx_factory._sample_cache_report.update(sample_cache_stats)
+                yield rendered_frames
+
+    def _compute_encoded_frames(self) -> Tuple[List[List[bytes]], List[List[DmxFrame]]]:
+        print("Rendering frames...")
+        self._ildx_factory._bake_exclusion_zones()
+
+        encoded_animations, dmx_animations = [], []
+        for animation_idx in range(len(self._start_ts)):
+            encoded_frames, dmx_frames = zip(*self._iter_rendered_frames(animation_idx))
+            encoded_animations.append(encoded_frames)
+            dmx_animations.append(dmx_frames)
+        return encoded_animations, dmx_animations
+
+    def _write_streamed_files(self):
+        # both files are written frame by frame in order as the workers finish
+        print("Rendering and writing frames...")
+        self._ildx_factory._bake_exclusion_zones()
+
+        with self._dmx_factory._create_writer() as dmx_writer:
+            def encoded_frames(animation_idx: int) -> Iterator[bytes]:
+                dmx_writer.start_animation()
+                for encoded_frame, dmx_frame in self._iter_rendered_frames(animation_idx):
+                    dmx_writer.add_frame(dmx_frame)
+                    yield encoded_frame
+
+            self._ildx_factory._write_encoded_file(
+                encoded_frames(animation_idx) for animation_idx in range(len(self._start_ts))
+            )
 
-        render_lines = self._ildx_factory._compute_render_lines(ildx_animations)
-        self._ildx_factory._write_file(render_lines)
+    def run(self):
+        if self._streaming:
+            self._write_streamed_files()
+            self._ildx_factory._print_sample_cache_report()
+            print("Done!")
+            return
+
+        if self._fused:
+            encoded_animations, dmx_animations = self._compute_encoded_frames()
+            self._ildx_factory._write_encoded_file(encoded_animations)
+        else:
+            ildx_animations, dmx_animations = self._compute_frames()
+            point_streams = self._ildx_factory._compute_point_streams(ildx_animations)
+            self._ildx_factory._write_file(point_streams)
 
         channels = self._dmx_factory._compute_channels(dmx_animations)
         self._dmx_factory._write_file(channels)
 
+        self._ildx_factory._print_sample_cache_report()
         print("Done!")
@@ -1,16 +1,34 @@
 from __future__ import annotations
+import numpy as np
 from typing import Tuple, List
 
 
+# index into (c, x, 0) for the r, g and b channel of each of the six hue sectors
+_HSV_SECTOR_COMPONENTS = np.array([
+    [0, 1, 2], [1, 0, 2], [2, 0, 1], [2, 1, 0], [1, 2, 0], [0, 2, 1]
+])
+
+
+def hsv_to_rgb(hsv: np.ndarray) -> np.ndarray:
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    c = v * s
+    x = c * (1 - np.abs((h * 6) % 2 - 1))
+    m = v - c
+
+    sector = np.floor(h * 6).astype(int)
+    sector = np.where((sector < 0) | (sector > 5), 5, sector)
+    components = np.stack([c, x, np.zeros_like(c)], axis=-1)
+    rgb = np.take_along_axis(components, _HSV_SECTOR_COMPONENTS[sector], axis=-1)
+    return rgb + m[..., np.newaxis]
+
+
 class Color:
-    
+
     r: int
     g: int
     b: int
 
-    h: int
-    s: int
-    v: int
+    _hsv: Tuple[float, float, float] | None
 
     @classmethod
     def black(cls) -> Color:
@@ -21,41 +39,65 @@ class Color:
             self.r = component_0
             self.g = component_1
             self.b = component_2
-            self._compute_hsv()
+            self._hsv = None
         else:
-            self.h = component_0
-            self.s = component_1
-            self.v = component_2
-            self._compute_rgb() 
+            self._hsv = (component_0, component_1, component_2)
+            self._compute_rgb()
 
     def __eq__(self, other: Color) -> bool:
         return self.r == other.r and self.g == other.g and self.b == other.b
-    
+
     def __hash__(self) -> int:
         return hash((self.r, self.g, self.b))
 
+    @property
+    def h(self) -> float:
+        return self._get_hsv()[0]
+
+    @property
+    def s(self) -> float:
+        return self._get_hsv()[1]
+
+    @property
+    def v(self) -> float:
+        return self._get_hsv()[2]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return np.array([self.r, self.g, self.b], dtype=float)
+
+    @property
+    def hsv(self) -> np.ndarray:
+        return np.array(self._get_hsv(), dtype=float)
+
+    def _get_hsv(self) -> Tuple[float, float, float]:
+        if self._hsv is None:
+            self._compute_hsv()
+        return self._hsv
+
     def _compute_rgb(self):
-        c = self.v * self.s
-        x = c * (1 - abs((self.h * 6) % 2 - 1))
-        m = self.v - c
+        h, s, v = self._hsv
+        c = v * s
+        x = c * (1 - abs((h * 6) % 2 - 1))
+        m = v - c
 
-        if 0 <= self.h < 1/6:
+        if 0 <= h < 1/6:
             self.r = c
             self.g = x
             self.b = 0
-        elif 1/6 <= self.h < 2/6:
+        elif 1/6 <= h < 2/6:
             self.r = x
             self.g = c
             self.b = 0
-        elif 2/6 <= self.h < 3/6:
+        elif 2/6 <= h < 3/6:
             self.r = 0
             self.g = c
             self.b = x
-        elif 3/6 <= self.h < 4/6:
+        elif 3/6 <= h < 4/6:
             self.r = 0
             self.g = x
             self.b = c
-        elif 4/6 <= self.h < 5/6:
+        elif 4/6 <= h < 5/6:
             self.r = x
             self.g = 0
             self.b = c
@@ -74,22 +116,22 @@ class Color:
         delta = c_max - c_min
 
         if delta == 0:
-            self.h = 0
+            h = 0
         elif c_max == self.r:
-            self.h = 60 * (((self.g - self.b) / delta) % 6)
+            h = 60 * (((self.g - self.b) / delta) % 6)
         elif c_max == self.g:
-            self.h = 60 * (((self.b - self.r) / delta) + 2)
+            h = 60 * (((self.b - self.r) / delta) + 2)
         else:
-            self.h = 60 * (((self.r - self.g) / delta) + 4)
+            h = 60 * (((self.r - self.g) / delta) + 4)
 
-        self.h = self.h / 360.0
+        h = h / 360.0
 
         if c_max == 0:
-            self.s = 0
+            s = 0
         else:
-            self.s = delta / c_max
+            s = delta / c_max
 
-        self.v = c_max
+        self._hsv = (h, s, c_max)
 
     def interpolate_rgb(self, other: Color, ratio: float):
         return Color(
@@ -97,7 +139,7 @@ class Color:
             self.g + (other.g - self.g) * ratio,
             self.b + (other.b - self.b) * ratio
         )
-    
+
     def interpolate_hsv(self, other: Color, ratio: float):
         return Color(
             self.h + (other.h - self.h) * ratio,
@@ -105,21 +147,36 @@ class Color:
             self.v + (other.v - self.v) * ratio,
             is_rgb=False
         )
-    
+
     def copy(self) -> Color:
         return Color(self.r, self.g, self.b)
 
 
 class ColorGradient:
-    
+
+    DEFAULT_LUT_SIZE: int = 1024
+
     _colors: List[Tuple[float, Color]]
     _interpolation_mode: str
-
-    def __init__(self, start_color: Color, end_color: Color | None = None, interpolation_mode: str = 'hsv'):
+    _lut_size: int | None
+
+    _positions: np.ndarray | None
+    _stop_colors: np.ndarray | None
+    _lut: np.ndarray | None
+
+    def __init__(
+        self,
+        start_color: Color,
+        end_color: Color | None = None,
+        interpolation_mode: str = 'hsv',
+        lut_size: int | None = None
+    ):
         if end_color is None:
             end_color = start_color
         self._colors = [(0.0, start_color), (1.0, end_color)]
         self._interpolation_mode = interpolation_mode
+        self._lut_size = lut_size
+        self._invalidate()
 
     def __eq__(self, other: ColorGradient) -> bool:
         if len(self._colors) != len(other._colors):
@@ -130,27 +187,62 @@ class ColorGradient:
         if self._interpolation_mode != other._interpolation_mode:
             return False
         return True
-    
+
     def __hash__(self) -> int:
         return hash(tuple(self._colors) + (self._interpolation_mode,))
 
+    def content_key(self) -> tuple:
+        return (
+            tuple((position, color.r, color.g, color.b) for position, color in self._colors),
+            self._interpolation_mode,
+            self._lut_size
+        )
+
+    def _invalidate(self):
+        self._positions = None
+        self._stop_colors = None
+        self._lut = None
+
     def add_color(self, s: float, color: Color):
-        self._colors.append((s, color))
-        self._colors.sort(key=lambda x: x[0])
+        # the stop list is replaced rather than modified, since copies share it
+        self._colors = sorted(self._colors + [(s, color)], key=lambda x: x[0])
+        self._invalidate()
+
+    def _compute_stops(self):
+        self._positions = np.array([position for position, _ in self._colors], dtype=float)
+        if self._interpolation_mode == 'rgb':
+            self._stop_colors = np.array([color.rgb for _, color in self._colors])
+        else:
+            self._stop_colors = np.array([color.hsv for _, color in self._colors])
+
+    def _interpolate(self, s: np.ndarray) -> np.ndarray:
+        if self._positions is None:
+            self._compute_stops()
+        positions, stop_colors = self._positions, self._stop_colors
+
+        # s lies in the stop interval (positions[i], positions[i + 1]]
+        i = np.clip(np.searchsorted(positions, s, side='left') - 1, 0, len(positions) - 2)
+        widths = positions[i + 1] - positions[i]
+        ratios = np.clip((s - positions[i]) / np.where(widths > 0.0, widths, 1.0), 0.0, 1.0)
+        colors = stop_colors[i] + (stop_colors[i + 1] - stop_colors[i]) * ratios[..., np.newaxis]
+
+        if self._interpolation_mode == 'rgb':
+            return colors
+        return hsv_to_rgb(colors)
+
+    def get_colors(self, s: np.ndarray) -> np.ndarray:
+        s = np.asarray(s, dtype=float)
+        if self._lut_size is None:
+            return self._interpolate(s)
+        if self._lut is None:
+            self._lut = self._interpolate(np.linspace(0.0, 1.0, self._lut_size))
+        indices = np.rint(np.clip(s, 0.0, 1.0) * (self._lut_size - 1)).astype(int)
+        return self._lut[indices]
 
     def get_color(self, s: float) -> Color:
-        for i in range(len(self._colors) - 1):
-            if self._colors[i][0] < s <= self._colors[i + 1][0]:
-                ratio = (s - self._colors[i][0]) / (self._colors[i + 1][0] - self._colors[i][0])
-                if self._interpolation_mode == 'rgb':
-                    return self._colors[i][1].interpolate_rgb(self._colors[i + 1][1], ratio)
-                else:
-                    return self._colors[i][1].interpolate_hsv(self._colors[i + 1][1], ratio)    
-        color = self._colors[0][1]
-        return color
-    
+        return Color(*self.get_colors(s))
+
     def copy(self) -> ColorGradient:
-        color_gradient = ColorGradient(self._colors[0][1], interpolation_mode=self._interpolation_mode)
-        for position, color in self._colors[1:]:
-            color_gradient.add_color(position, color.copy())
+        color_gradient = ColorGradient.__new__(ColorGradient)
+        color_gradient.__dict__.update(self.__dict__)
         return color_gradient
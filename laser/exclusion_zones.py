@@ -0,0 +1,220 @@
+from __future__ import annotations
+import numpy as np
+from uuid import uuid4
+from scipy.ndimage import distance_transform_edt
+from typing import Dict, Iterator, List, Tuple
+
+from laser.shapes.shape import Shape
+from laser.point_stream import PointStream
+
+
+# baked grids by token, filled in worker processes by share_baked_masks
+_baked_masks: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def share_baked_masks(masks: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+    for mask, clearance in masks.values():
+        mask.flags.writeable = False
+        clearance.flags.writeable = False
+    _baked_masks.update(masks)
+
+
+class ExclusionZones:
+
+    SPLIT_EPSILON: float = 1e-9
+    BAKE_CHUNK_ROWS: int = 64
+
+    _zones: List[Tuple[Shape, bool]]
+
+    _bake_token: str | None
+    _mask: np.ndarray | None
+    _clearance: np.ndarray | None
+
+    def __init__(self, zones: List[Tuple[Shape, bool]] | None = None):
+        self._zones = list(zones) if zones is not None else []
+        self._bake_token = None
+        self._mask = None
+        self._clearance = None
+
+    def __getstate__(self) -> dict:
+        # the baked grids reach workers once through share_baked_masks, not with every task
+        state = self.__dict__.copy()
+        state['_mask'] = None
+        state['_clearance'] = None
+        return state
+
+    def __iter__(self) -> Iterator[Tuple[Shape, bool]]:
+        return iter(self._zones)
+
+    def __len__(self) -> int:
+        return len(self._zones)
+
+    def add(self, shape: Shape, inside: bool = True):
+        self._zones.append((shape, inside))
+        self._unbake()
+
+    def _unbake(self):
+        if self._bake_token is not None:
+            _baked_masks.pop(self._bake_token, None)
+        self._bake_token = None
+        self._mask = None
+        self._clearance = None
+
+    @property
+    def is_baked(self) -> bool:
+        return self._bake_token is not None
+
+    def bake(self, resolution: int):
+        self._unbake()
+        cell_size = 2.0 / resolution
+        centers = -1.0 + (np.arange(resolution) + 0.5) * cell_size
+
+        mask = np.zeros((resolution, resolution), dtype=bool)
+        zone_distances = np.full((resolution, resolution), np.inf)
+        for shape, inside in self._zones:
+            in_zone = np.zeros((resolution, resolution), dtype=bool)
+            # cells outside the zone's bounding box are outside the zone, and the distance
+            # to the box bounds the distance to the zone's boundary from below
+            minimum, maximum = shape.bounding_box()
+            # zones measure distances in their local space; dividing by the largest local
+            # over world scale keeps them lower bounds of the world distances
+            distance_scale = shape._local_distance_scale()
+            first = np.clip(np.floor((minimum + 1.0) / cell_size).astype(int) - 1, 0, resolution)
+            last = np.clip(np.ceil((maximum + 1.0) / cell_size).astype(int) + 1, 0, resolution)
+            X, Y = np.meshgrid(centers, centers)
+            box_offsets = np.maximum(np.maximum(minimum[0] - X, X - maximum[0]), 0.0), np.maximum(np.maximum(minimum[1] - Y, Y - maximum[1]), 0.0)
+            zone_distances = np.minimum(zone_distances, np.hypot(*box_offsets))
+
+            for row in range(first[1], last[1], self.BAKE_CHUNK_ROWS):
+                rows = slice(row, min(row + self.BAKE_CHUNK_ROWS, last[1]))
+                columns = slice(first[0], last[0])
+                X, Y = np.meshgrid(centers[columns], centers[rows])
+                cell_centers = np.column_stack([X.ravel(), Y.ravel()])
+                signed_distances = shape.signed_distances(cell_centers).reshape(X.shape)
+                if shape._encloses_area():
+                    in_zone[rows, columns] = signed_distances <= 0
+                if distance_scale is None:
+                    # projective zones only keep the box bound and are checked exactly inside it
+                    distances = np.zeros(X.shape)
+                else:
+                    # zones thinner than a cell mark no cell centers, so their boundary
+                    # distances keep nearby segments on the exact check
+                    distances = np.abs(signed_distances) / distance_scale
+                # several zones overlap the same cells, the nearest boundary bounds them all
+                zone_distances[rows, columns] = np.minimum(zone_distances[rows, columns], distances)
+            mask |= in_zone if inside else ~in_zone
+
+        # distance from each cell to the nearest cell of the other kind, less one cell
+        # diagonal for the quantization of both the cell and the boundary
+        if np.all(mask) or not np.any(mask):
+            boundary_distances = np.full(mask.shape, np.inf)
+        else:
+            boundary_distances = np.where(mask, distance_transform_edt(mask), distance_transform_edt(~mask)) * cell_size
+        clearance = np.minimum(boundary_distances, zone_distances) - cell_size * np.sqrt(2)
+
+        self._bake_token = uuid4().hex
+        self._mask = mask
+        self._clearance = clearance.astype(np.float32)
+        share_baked_masks({self._bake_token: (self._mask, self._clearance)})
+
+    def baked_masks(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        if self._bake_token is None:
+            return {}
+        return {self._bake_token: _baked_masks[self._bake_token]}
+
+    def _baked(self) -> Tuple[np.ndarray, np.ndarray] | None:
+        if self._bake_token is None:
+            return None
+        if self._mask is None:
+            if self._bake_token not in _baked_masks:
+                return None
+            self._mask, self._clearance = _baked_masks[self._bake_token]
+        return self._mask, self._clearance
+
+    def _lookup(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        baked = self._baked()
+        if baked is None:
+            return np.zeros(len(ends), dtype=bool), np.zeros(len(ends), dtype=bool)
+        mask, clearance = baked
+        resolution = len(mask)
+        start_cells = np.clip(((starts + 1.0) * 0.5 * resolution).astype(int), 0, resolution - 1)
+        end_cells = np.clip(((ends + 1.0) * 0.5 * resolution).astype(int), 0, resolution - 1)
+        # no boundary lies within the clearance of either end, so a shorter segment stays on one side
+        lengths = np.linalg.norm(ends - starts, axis=1)
+        certain = lengths < np.maximum(
+            clearance[start_cells[:, 1], start_cells[:, 0]],
+            clearance[end_cells[:, 1], end_cells[:, 0]]
+        )
+        return certain, mask[end_cells[:, 1], end_cells[:, 0]]
+
+    def _split(self, stream: PointStream, segments: np.ndarray | None = None) -> Tuple[PointStream, np.ndarray]:
+        points = stream.points
+        candidates = np.arange(len(stream) - 1) if segments is None else np.nonzero(segments)[0]
+        starts, ends = points[candidates], points[candidates + 1]
+
+        segment_indices, ts = [np.empty(0, dtype=int)], [np.empty(0)]
+        for shape, _ in self._zones:
+            if not shape._encloses_area() or len(candidates) == 0:
+                continue
+            indices, t = shape._line_crossings(starts, ends)
+            keep = (t > self.SPLIT_EPSILON) & (t < 1 - self.SPLIT_EPSILON)
+            segment_indices.append(candidates[indices[keep]])
+            ts.append(t[keep])
+        segment_indices, ts = np.concatenate(segment_indices), np.concatenate(ts)
+        if len(segment_indices) == 0:
+            return stream, np.arange(len(stream))
+
+        order = np.lexsort((ts, segment_indices))
+        segment_indices, ts = segment_indices[order], ts[order]
+
+        # crossings of segment i are inserted between point i and point i + 1
+        n_points = len(stream) + len(segment_indices)
+        original_positions = np.arange(len(stream)) + np.searchsorted(segment_indices, np.arange(len(stream)), side='left')
+        crossing_positions = segment_indices + 1 + np.arange(len(segment_indices))
+
+        def interpolate(values: np.ndarray) -> np.ndarray:
+            result = np.empty((n_points,) + values.shape[1:], dtype=values.dtype)
+            result[original_positions] = values
+            ratios = ts.reshape((-1,) + (1,) * (values.ndim - 1))
+            result[crossing_positions] = values[segment_indices] + (values[segment_indices + 1] - values[segment_indices]) * ratios
+            return result
+
+        # the original point each new point (and the piece leading to it) comes from
+        sources = np.empty(n_points, dtype=int)
+        sources[original_positions] = np.arange(len(stream))
+        sources[crossing_positions] = segment_indices + 1
+
+        blanked = np.empty(n_points, dtype=bool)
+        blanked[original_positions] = stream.blanked
+        # every piece of a segment inherits whether the beam travels dark to its end
+        blanked[crossing_positions] = stream.blanked[segment_indices + 1]
+
+        return PointStream(interpolate(points), interpolate(stream.colors), blanked, interpolate(stream.s_values)), sources
+
+    def _excluded(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        excluded = np.zeros(len(starts), dtype=bool)
+        midpoints = (starts + ends) / 2
+        for shape, inside in self._zones:
+            if shape._encloses_area():
+                in_zone = shape.are_points_inside(midpoints)
+            else:
+                in_zone = np.zeros(len(starts), dtype=bool)
+                in_zone[shape._line_crossings(starts, ends)[0]] = True
+            excluded |= in_zone if inside else ~in_zone
+        return excluded
+
+    def apply(self, stream: PointStream) -> PointStream:
+        if not self._zones or len(stream) == 0:
+            return stream
+
+        # the first point has no incoming segment, so it is classified on its own
+        points = stream.points
+        certain, excluded = self._lookup(np.concatenate([points[:1], points[:-1]]), points)
+
+        stream, sources = self._split(stream, ~certain[1:])
+        points = stream.points
+        starts = np.concatenate([points[:1], points[:-1]])
+        certain, excluded = certain[sources], excluded[sources]
+        excluded[~certain] = self._excluded(starts[~certain], points[~certain])
+        stream.blank(excluded)
+        return stream
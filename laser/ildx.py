@@ -1,4 +1,7 @@
 import ctypes
+import numpy as np
+
+from laser.point_stream import PointStream
 
 
 ILDX_MAGIC = 0x494C4458
@@ -7,6 +10,12 @@ ILDA_MAGIC = 0x494C4441
 ILDX_STATUS_CODE_LAST_POINT_MASK = 0b10000000;
 ILDX_STATUS_CODE_BLANKING_MASK = 0b01000000;
 
+ILDX_FORMAT_CODE_3D_INDEXED = 0
+ILDX_FORMAT_CODE_2D_INDEXED = 1
+ILDX_FORMAT_CODE_COLOR_PALETTE = 2
+ILDX_FORMAT_CODE_3D_TRUE_COLOR = 4
+ILDX_FORMAT_CODE_2D_TRUE_COLOR = 5
+
 
 class IldxHeader(ctypes.BigEndianStructure):
     _fields_ = [
@@ -85,3 +94,66 @@ def adjust_start_time(time: int | float) -> bytes:
 
 def zero_start_time() -> bytes:
     return (ctypes.c_uint8 * 3)(*bytes([0, 0, 0]))
+
+
+# big-endian numpy layouts of the record structures above, by format code
+RECORD_DTYPES = {
+    ILDX_FORMAT_CODE_3D_INDEXED: np.dtype([('x', '>i2'), ('y', '>i2'), ('z', '>i2'), ('statusCode', 'u1'), ('colorIndex', 'u1')]),
+    ILDX_FORMAT_CODE_2D_INDEXED: np.dtype([('x', '>i2'), ('y', '>i2'), ('statusCode', 'u1'), ('colorIndex', 'u1')]),
+    ILDX_FORMAT_CODE_3D_TRUE_COLOR: np.dtype([('x', '>i2'), ('y', '>i2'), ('z', '>i2'), ('statusCode', 'u1'), ('r', 'u1'), ('g', 'u1'), ('b', 'u1')]),
+    ILDX_FORMAT_CODE_2D_TRUE_COLOR: np.dtype([('x', '>i2'), ('y', '>i2'), ('statusCode', 'u1'), ('r', 'u1'), ('g', 'u1'), ('b', 'u1')])
+}
+PALETTE_DTYPE = np.dtype([('r', 'u1'), ('g', 'u1'), ('b', 'u1')])
+MAX_PALETTE_SIZE = 256
+
+
+def _wrapped(values: np.ndarray, dtype: str) -> np.ndarray:
+    # truncate like int() and wrap like the ctypes fields do
+    return np.trunc(values).astype(np.int64).astype(dtype)
+
+
+def encode_records(point_stream: PointStream, format_code: int, coordinate_scale: float, palette: np.ndarray | None = None) -> bytes:
+    """
+    Encode all points of a stream as records of the given format. Indexed formats use
+    the palette entry (rgb in [0, 1]) closest to each point's color.
+    """
+    if format_code not in RECORD_DTYPES:
+        raise ValueError(f"Unsupported record format code {format_code}")
+    dtype = RECORD_DTYPES[format_code]
+    if 'colorIndex' in dtype.names:
+        if palette is None:
+            raise ValueError("Indexed record formats need a palette")
+        palette = np.asarray(palette, dtype=float).reshape(-1, 3)
+        if len(palette) > MAX_PALETTE_SIZE:
+            raise ValueError(f"Palettes hold at most {MAX_PALETTE_SIZE} colors")
+    records = np.zeros(len(point_stream), dtype=dtype)
+
+    records['x'] = _wrapped(point_stream.points[:, 0] * coordinate_scale, 'i2')
+    records['y'] = _wrapped(point_stream.points[:, 1] * coordinate_scale, 'i2')
+
+    status_codes = np.where(point_stream.blanked, ILDX_STATUS_CODE_BLANKING_MASK, 0).astype(np.uint8)
+    if len(status_codes) > 0:
+        status_codes[-1] |= ILDX_STATUS_CODE_LAST_POINT_MASK
+    records['statusCode'] = status_codes
+
+    if 'colorIndex' in dtype.names:
+        distances = np.sum((point_stream.colors[:, np.newaxis, :] - palette[np.newaxis]) ** 2, axis=2)
+        records['colorIndex'] = np.argmin(distances, axis=1) if len(palette) > 0 else 0
+    else:
+        rgb = _wrapped(255 * point_stream.colors, 'u1')
+        records['r'], records['g'], records['b'] = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+
+    return records.tobytes()
+
+
+def encode_palette(palette: np.ndarray) -> bytes:
+    """
+    Encode palette colors (rgb in [0, 1]) as the records of a color palette section.
+    """
+    palette = np.asarray(palette, dtype=float).reshape(-1, 3)
+    if len(palette) > MAX_PALETTE_SIZE:
+        raise ValueError(f"Palettes hold at most {MAX_PALETTE_SIZE} colors")
+    records = np.zeros(len(palette), dtype=PALETTE_DTYPE)
+    rgb = _wrapped(255 * palette, 'u1')
+    records['r'], records['g'], records['b'] = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    return records.tobytes()
@@ -1,23 +1,33 @@
 from laser.shapes.shape import Shape
 from laser.frame import Frame
-from laser.color import Color
-from laser.render_line import RenderLine
-from laser.ildx import ILDA_MAGIC, ILDX_MAGIC, IldxHeader, Ilda2dTrueColorRecord, adjust_start_time, zero_start_time, ILDX_STATUS_CODE_BLANKING_MASK, ILDX_STATUS_CODE_LAST_POINT_MASK
-from typing import Callable, List, Tuple
+from laser.point_stream import PointStream
+from laser.exclusion_zones import ExclusionZones, share_baked_masks
+from laser.sdf_cache import configure_sdf_cache
+from laser.sample_cache import SampleCacheReport, WithSampleCacheStats
+from laser.ildx import ILDA_MAGIC, ILDX_MAGIC, IldxHeader, adjust_start_time, zero_start_time, encode_records, encode_palette, RECORD_DTYPES, ILDX_FORMAT_CODE_2D_TRUE_COLOR, ILDX_FORMAT_CODE_COLOR_PALETTE, MAX_PALETTE_SIZE
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
 from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import cpu_count
+from functools import partial
 from math import ceil
 
 from tqdm import tqdm
+from util import ordered_bounded_map
+
+
+def initialize_worker(sdf_cache_directory: str | None, baked_masks: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+    configure_sdf_cache(sdf_cache_directory)
+    share_baked_masks(baked_masks)
 
 
 class FillFrame:
 
     _factory_function: Callable[[Frame], None]
-    _exclusion_zones: List[Tuple[Shape, bool]]
+    _exclusion_zones: ExclusionZones
     _show_exclusion_zones: bool
 
-    def __init__(self, factory_function: Callable[[Frame], None], exclusion_zones: List[Tuple[Shape, bool]], show_exclusion_zones: bool):
+    def __init__(self, factory_function: Callable[[Frame], None], exclusion_zones: ExclusionZones, show_exclusion_zones: bool):
         self._factory_function = factory_function
         self._exclusion_zones = exclusion_zones
         self._show_exclusion_zones = show_exclusion_zones
@@ -30,10 +40,127 @@ class FillFrame:
         return frame
 
 
+def compute_point_stream(frame: Frame, exclusion_zones: ExclusionZones) -> PointStream:
+    # every shape is sampled exactly once; the jumps between shapes are stitched afterwards
+    sampled_streams = [shape.get_point_stream(frame.t) for shape, _ in frame.shapes]
+
+    point_streams = []
+    for index, (sampled_stream, (_, is_exclusion_shape)) in enumerate(zip(sampled_streams, frame.shapes)):
+        point_stream = sampled_stream if is_exclusion_shape else exclusion_zones.apply(sampled_stream)
+        point_streams.append(point_stream)
+
+        if index + 1 < len(sampled_streams):
+            next_point_stream = sampled_streams[index + 1]
+            if len(next_point_stream) > 0:
+                point_streams.append(PointStream(
+                    next_point_stream.points[:1],
+                    np.zeros((1, 3)),
+                    np.ones(1, dtype=bool),
+                    next_point_stream.s_values[:1]
+                ))
+
+    return PointStream.concatenate(point_streams)
+
+
+def flip_point_stream(point_stream: PointStream, flip_x: bool, flip_y: bool):
+    if flip_x:
+        point_stream.flip_x()
+    if flip_y:
+        point_stream.flip_y()
+
+
+class EncodeFrame:
+
+    _start_t: float
+    _fps: float
+    _total_frames: int
+    _format_code: int
+    _palette: np.ndarray | None
+    _frame_name: str
+    _company_name: str
+    _projector_number: int
+    _legacy_mode: bool
+
+    def __init__(
+        self,
+        start_t: float,
+        fps: float,
+        total_frames: int,
+        format_code: int,
+        palette: np.ndarray | None,
+        frame_name: str,
+        company_name: str,
+        projector_number: int,
+        legacy_mode: bool
+    ):
+        self._start_t = start_t
+        self._fps = fps
+        self._total_frames = total_frames
+        self._format_code = format_code
+        self._palette = palette
+        self._frame_name = frame_name
+        self._company_name = company_name
+        self._projector_number = projector_number
+        self._legacy_mode = legacy_mode
+
+    def __call__(self, point_stream: PointStream, frame_idx: int) -> bytes:
+        header = IldxHeader(
+            ildxMagic=ILDA_MAGIC,
+            starttime=(
+                zero_start_time() if self._legacy_mode
+                else adjust_start_time(self._start_t)
+            ),
+            formatCode=self._format_code,
+            companyName=bytes(self._company_name, encoding="ascii"),
+            frameName=bytes(self._frame_name, encoding="ascii"),
+            numberOfRecords=len(point_stream),
+            frameOrPaletteNumber=frame_idx,
+            totalFrames=self._total_frames,
+            projectorNumber=self._projector_number,
+            framesPerSecondOrFrameAmount=(
+                0 if self._legacy_mode
+                else self._fps if frame_idx == 0 else 1
+            )
+        )
+        return bytes(header) + encode_records(point_stream, self._format_code, Shape.ILDX_RESOLUTION * 0.5, self._palette)
+
+
+class RenderFilledFrame:
+
+    _exclusion_zones: ExclusionZones
+    _flip_x: bool
+    _flip_y: bool
+    _encode_frame: EncodeFrame
+
+    def __init__(self, exclusion_zones: ExclusionZones, flip_x: bool, flip_y: bool, encode_frame: EncodeFrame):
+        self._exclusion_zones = exclusion_zones
+        self._flip_x = flip_x
+        self._flip_y = flip_y
+        self._encode_frame = encode_frame
+
+    def __call__(self, frame_idx: int, frame: Frame) -> bytes:
+        point_stream = compute_point_stream(frame, self._exclusion_zones)
+        flip_point_stream(point_stream, self._flip_x, self._flip_y)
+        return self._encode_frame(point_stream, frame_idx)
+
+
+class RenderFrame:
+
+    _fill_frame: FillFrame
+    _render_filled_frame: RenderFilledFrame
+
+    def __init__(self, fill_frame: FillFrame, render_filled_frame: RenderFilledFrame):
+        self._fill_frame = fill_frame
+        self._render_filled_frame = render_filled_frame
+
+    def __call__(self, frame_idx: int, frame: Frame) -> bytes:
+        return self._render_filled_frame(frame_idx, self._fill_frame(frame))
+
+
 class IldxFactory:
 
     ILDX_NAME_LENGTH: int = 8
-    FORMAT_CODE_2D_TRUE_COLOR: int = 5
+    FORMAT_CODE_2D_TRUE_COLOR: int = ILDX_FORMAT_CODE_2D_TRUE_COLOR
     FRAME_BATCH_SIZE_FACTOR: int = 2
     
     _fps: float
@@ -49,8 +176,15 @@ class IldxFactory:
     _company_name: str
     _projector_number: int
     _legacy_mode: bool
+    _sdf_cache_directory: str | None
+    _exclusion_zone_resolution: int | None
+    _fused: bool
+    _streaming: bool
+    _format_code: int
+    _palette: np.ndarray | None
 
-    _exclusion_zones: List[Tuple[Shape, bool]]
+    _exclusion_zones: ExclusionZones
+    _sample_cache_report: SampleCacheReport
 
     def __init__(
         self, 
@@ -66,7 +200,13 @@ class IldxFactory:
         frame_names: List[str] = [],
         company_name: str = "",
         projector_number: int = 0,
-        legacy_mode: bool = False
+        legacy_mode: bool = False,
+        sdf_cache_directory: str | None = None,
+        exclusion_zone_resolution: int | None = None,
+        fused: bool = False,
+        streaming: bool = False,
+        format_code: int = ILDX_FORMAT_CODE_2D_TRUE_COLOR,
+        palette: np.ndarray | None = None
     ):
         self._fps = fps
         self._durations = durations if isinstance(durations, list) else [durations]
@@ -84,14 +224,27 @@ class IldxFactory:
         self._company_name = self._format_ildx_name(company_name)
         self._projector_number = projector_number
         self._legacy_mode = legacy_mode
+        self._sdf_cache_directory = sdf_cache_directory
+        self._exclusion_zone_resolution = exclusion_zone_resolution
+        self._fused = fused
+        self._streaming = streaming
+        if format_code not in RECORD_DTYPES:
+            raise ValueError(f"Unsupported record format code {format_code}")
+        if 'colorIndex' in RECORD_DTYPES[format_code].names and palette is None:
+            raise ValueError("Indexed record formats need a palette")
+        if palette is not None and len(np.asarray(palette).reshape(-1, 3)) > MAX_PALETTE_SIZE:
+            raise ValueError(f"Palettes hold at most {MAX_PALETTE_SIZE} colors")
+        self._format_code = format_code
+        self._palette = None if palette is None else np.asarray(palette, dtype=float).reshape(-1, 3)
 
         while len(self._frame_names) < len(self._durations):
             self._frame_names.append(self._format_ildx_name(""))
 
-        self._exclusion_zones = []
+        self._exclusion_zones = ExclusionZones()
+        self._sample_cache_report = SampleCacheReport()
 
     def add_exclusion_zone(self, shape: Shape, inside: bool = True):
-        self._exclusion_zones.append((shape, inside))
+        self._exclusion_zones.add(shape, inside)
 
     def _format_ildx_name(self, name: str) -> str:
         if len(name) > self.ILDX_NAME_LENGTH:
@@ -109,7 +262,11 @@ class IldxFactory:
                 Frame(start_t, start_t + (i / self._fps), self._fps, duration, self._point_density) 
                 for i in range(ceil(self._fps * duration))
             )
-            with ProcessPoolExecutor(max_workers=cpu_count() - 1) as executor:
+            with ProcessPoolExecutor(
+                max_workers=cpu_count() - 1,
+                initializer=configure_sdf_cache,
+                initargs=(self._sdf_cache_directory,)
+            ) as executor:
                 frames = list(tqdm(
                     executor.map(FillFrame(factory_function, self._exclusion_zones, self._show_exclusion_zones), empty_frames), 
                     total=ceil(self._fps * duration), 
@@ -118,115 +275,132 @@ class IldxFactory:
             animations.append(frames)
         return animations
     
-    def _compute_render_lines_for_frame(self, frame: Frame) -> List[RenderLine]:
-        render_lines = []
-        for (shape, is_exclusion_shape), (next_shape, _) in zip(frame.shapes, frame.shapes[1:] + [(None, None)]):
-
-            for render_line in shape.get_render_lines(frame.t):
-                if not is_exclusion_shape:
-
-                    for exclusion_shape, is_inside in self._exclusion_zones:
-                        if (
-                            is_inside and exclusion_shape.is_line_inside(render_line.p0, render_line.p1)
-                            or not is_inside and exclusion_shape.is_line_outside(render_line.p0, render_line.p1)
-                        ):
-                            render_line.blank()
-
-                render_lines.append(render_line)
-            
-            if next_shape:
-                try:
-                    render_lines.append(
-                        RenderLine(
-                            render_lines[-1].p1,
-                            next(next_shape.get_render_lines(frame.t)).p0,
-                            Color.black(),
-                            blanked=True
-                        )
-                    )
-                except (StopIteration, IndexError):
-                    pass
-                
-        if render_lines:
-            render_lines.insert(0, render_lines[0].copy())
-        return render_lines
-    
-    def _compute_render_lines(self, animations: List[List[Frame]]) -> List[List[List[RenderLine]]]:
-        print("Computing ILDX lines...")
-        all_render_lines = []
+    def _frame_count(self, animation_idx: int) -> int:
+        return ceil(self._fps * self._durations[animation_idx])
+
+    def _bake_exclusion_zones(self):
+        if self._exclusion_zone_resolution is not None and len(self._exclusion_zones) > 0 and not self._exclusion_zones.is_baked:
+            self._exclusion_zones.bake(self._exclusion_zone_resolution)
+
+    def _finish_point_stream(self, point_stream: PointStream):
+        flip_point_stream(point_stream, self._flip_x, self._flip_y)
+
+    def _compute_point_streams(self, animations: List[List[Frame]]) -> List[List[PointStream]]:
+        print("Computing ILDX point streams...")
+        self._bake_exclusion_zones()
+
+        all_point_streams = []
         for animation in animations:
-            render_lines = []
-            with ProcessPoolExecutor(max_workers=cpu_count() - 1) as executor:
-                for frame in tqdm(
-                    executor.map(self._compute_render_lines_for_frame, animation), 
+            point_streams = []
+            with ProcessPoolExecutor(
+                max_workers=cpu_count() - 1,
+                initializer=share_baked_masks,
+                initargs=(self._exclusion_zones.baked_masks(),)
+            ) as executor:
+                for point_stream, sample_cache_stats in tqdm(
+                    executor.map(WithSampleCacheStats(partial(compute_point_stream, exclusion_zones=self._exclusion_zones)), animation), 
                     total=len(animation),
-                    desc=f"Animation {len(all_render_lines) + 1}/{len(animations)}"
+                    desc=f"Animation {len(all_point_streams) + 1}/{len(animations)}"
                 ):
-                    render_lines.append(frame)
-            # for frame in frames:
-            #     render_lines.append(self._compute_render_lines_for_frame(frame))
-
-            if self._flip_x:
-                for frame in render_lines:
-                    for render_line in frame:
-                        render_line.flip_x()
-
-            if self._flip_y:
-                for frame in render_lines:
-                    for render_line in frame:
-                        render_line.flip_y()
-
-            all_render_lines.append(render_lines)
-        return all_render_lines
-    
-    def _write_file(self, render_lines: List[List[List[RenderLine]]]):
-        print("Writing ILDX file...")
-        target = bytearray()
-        for animation_idx, animation in enumerate(render_lines):
-            for frame_idx, frame in tqdm(
-                enumerate(animation), 
-                total=len(animation),
-                desc=f"Animation {len(target) + 1}/{len(render_lines)}"
+                    point_streams.append(point_stream)
+                    self._sample_cache_report.update(sample_cache_stats)
+
+            for point_stream in point_streams:
+                self._finish_point_stream(point_stream)
+
+            all_point_streams.append(point_streams)
+        return all_point_streams
+
+    def _filled_frame_renderer(self, animation_idx: int) -> RenderFilledFrame:
+        return RenderFilledFrame(self._exclusion_zones, self._flip_x, self._flip_y, self._frame_encoder(animation_idx, self._frame_count(animation_idx)))
+
+    def _iter_encoded_frames(self, animation_idx: int) -> Iterator[bytes]:
+        # workers fill, sample, clip and encode frames, so only the finished records
+        # travel back to this process; at most a few frames per worker are in flight
+        frame_count = self._frame_count(animation_idx)
+        start_t = self._start_ts[animation_idx]
+        empty_frames = (
+            Frame(start_t, start_t + (i / self._fps), self._fps, self._durations[animation_idx], self._point_density)
+            for i in range(frame_count)
+        )
+        max_workers = cpu_count() - 1
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=initialize_worker,
+            initargs=(self._sdf_cache_directory, self._exclusion_zones.baked_masks())
+        ) as executor:
+            # tasks only carry what a worker needs to render a frame, not the whole factory
+            render_frame = RenderFrame(
+                FillFrame(self._factory_functions[animation_idx], self._exclusion_zones, self._show_exclusion_zones),
+                self._filled_frame_renderer(animation_idx)
+            )
+            for encoded_frame, sample_cache_stats in tqdm(
+                ordered_bounded_map(
+                    executor, WithSampleCacheStats(render_frame), range(frame_count), empty_frames,
+                    window=self.FRAME_BATCH_SIZE_FACTOR * max_workers
+                ),
+                total=frame_count,
+                desc=f"Animation {animation_idx + 1}/{len(self._durations)}"
             ):
-                header = IldxHeader(
-                    ildxMagic=ILDA_MAGIC,
-                    starttime=(
-                        zero_start_time() if self._legacy_mode
-                        else adjust_start_time(self._start_ts[animation_idx])
-                    ),
-                    formatCode=self.FORMAT_CODE_2D_TRUE_COLOR,
-                    companyName=bytes(self._company_name, encoding="ascii"),
-                    frameName=bytes(self._frame_names[animation_idx], encoding="ascii"),
-                    numberOfRecords=len(frame),
-                    frameOrPaletteNumber=frame_idx,
-                    totalFrames=len(animation),
-                    projectorNumber=self._projector_number,
-                    framesPerSecondOrFrameAmount=(
-                        0 if self._legacy_mode
-                        else self._fps if frame_idx == 0 else 1
-                    )
+                self._sample_cache_report.update(sample_cache_stats)
+                yield encoded_frame
+
+    def _compute_encoded_frames(self) -> List[List[bytes]]:
+        print("Rendering ILDX animations...")
+        self._bake_exclusion_zones()
+        return [list(self._iter_encoded_frames(animation_idx)) for animation_idx in range(len(self._start_ts))]
+
+    def _frame_encoder(self, animation_idx: int, total_frames: int) -> EncodeFrame:
+        return EncodeFrame(
+            self._start_ts[animation_idx],
+            self._fps,
+            total_frames,
+            self._format_code,
+            self._palette,
+            self._frame_names[animation_idx],
+            self._company_name,
+            self._projector_number,
+            self._legacy_mode
+        )
+
+    def _write_file(self, point_streams: List[List[PointStream]]):
+        encoded_animations = []
+        for animation_idx, animation in enumerate(point_streams):
+            encode_frame = self._frame_encoder(animation_idx, len(animation))
+            encoded_animations.append([
+                encode_frame(point_stream, frame_idx)
+                for frame_idx, point_stream in tqdm(
+                    enumerate(animation), 
+                    total=len(animation),
+                    desc=f"Encoding animation {animation_idx + 1}/{len(point_streams)}"
                 )
-                target.extend(bytearray(header))
-                for line_idx, render_line in enumerate(frame):
-                    status_code = 0
-                    if render_line.blanked:
-                        status_code |= ILDX_STATUS_CODE_BLANKING_MASK
-                    if line_idx == len(frame) - 1:
-                        status_code |= ILDX_STATUS_CODE_LAST_POINT_MASK
-                    record = Ilda2dTrueColorRecord(
-                        x=int(render_line.p1[0] * Shape.ILDX_RESOLUTION * 0.5),
-                        y=int(render_line.p1[1] * Shape.ILDX_RESOLUTION * 0.5),
-                        statusCode=status_code,
-                        r=int(255 * render_line.color.r),
-                        g=int(255 * render_line.color.g),
-                        b=int(255 * render_line.color.b)
-                    )
-                    target.extend(bytearray(record))
+            ])
+        self._write_encoded_file(encoded_animations)
 
+    def _encode_palette_section(self) -> bytes:
+        # indexed frames refer to the palette by index, so it leads the file for players to pick up
+        if 'colorIndex' not in RECORD_DTYPES[self._format_code].names:
+            return b""
+        header = IldxHeader(
+            ildxMagic=ILDA_MAGIC,
+            starttime=zero_start_time(),
+            formatCode=ILDX_FORMAT_CODE_COLOR_PALETTE,
+            companyName=bytes(self._company_name, encoding="ascii"),
+            frameName=bytes(self._format_ildx_name(""), encoding="ascii"),
+            numberOfRecords=len(self._palette),
+            frameOrPaletteNumber=0,
+            totalFrames=0,
+            projectorNumber=self._projector_number,
+            framesPerSecondOrFrameAmount=0
+        )
+        return bytes(header) + encode_palette(self._palette)
+
+    def _write_encoded_file(self, encoded_animations: Iterable[Iterable[bytes]]):
+        print("Writing ILDX file...")
         last_header = IldxHeader(
             ildxMagic=ILDA_MAGIC,
             starttime=adjust_start_time(0),
-            formatCode=self.FORMAT_CODE_2D_TRUE_COLOR,
+            formatCode=self._format_code,
             companyName=bytes(self._format_ildx_name(""), encoding='ascii'),
             frameName=bytes(self._format_ildx_name(""), encoding='ascii'),
             numberOfRecords=0,
@@ -235,12 +409,34 @@ class IldxFactory:
             projectorNumber=0,
             framesPerSecondOrFrameAmount=0
         )
-        target.extend(bytearray(last_header))
+        # frames are written as they arrive, so lazily rendered animations are never held
+        # in memory; their headers already carry the final frame counts
         with open(self._ildx_filename, 'wb') as file:
-            file.write(target)
+            file.write(self._encode_palette_section())
+            for animation in encoded_animations:
+                for encoded_frame in animation:
+                    file.write(encoded_frame)
+            file.write(bytearray(last_header))
     
+    def _write_streamed_file(self):
+        print("Rendering and writing ILDX animations...")
+        self._bake_exclusion_zones()
+        self._write_encoded_file(
+            self._iter_encoded_frames(animation_idx) for animation_idx in range(len(self._start_ts))
+        )
+
+    def _print_sample_cache_report(self):
+        for line in self._sample_cache_report.lines():
+            print(line)
+
     def run(self):
-        animations = self._compute_frames()
-        render_lines = self._compute_render_lines(animations)
-        self._write_file(render_lines)
+        if self._streaming:
+            self._write_streamed_file()
+        elif self._fused:
+            self._write_encoded_file(self._compute_encoded_frames())
+        else:
+            animations = self._compute_frames()
+            point_streams = self._compute_point_streams(animations)
+            self._write_file(point_streams)
+        self._print_sample_cache_report()
         print("Done!")
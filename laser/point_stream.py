@@ -0,0 +1,68 @@
+from __future__ import annotations
+import numpy as np
+from typing import List
+
+
+class PointStream:
+
+    _points: np.ndarray
+    _colors: np.ndarray
+    _blanked: np.ndarray
+    _s_values: np.ndarray
+
+    @classmethod
+    def empty(cls) -> PointStream:
+        return cls(np.empty((0, 2)), np.empty((0, 3)), np.empty(0, dtype=bool), np.empty(0))
+
+    @classmethod
+    def concatenate(cls, streams: List[PointStream]) -> PointStream:
+        if not streams:
+            return cls.empty()
+        return cls(
+            np.concatenate([stream._points for stream in streams]),
+            np.concatenate([stream._colors for stream in streams]),
+            np.concatenate([stream._blanked for stream in streams]),
+            np.concatenate([stream._s_values for stream in streams])
+        )
+
+    def __init__(self, points: np.ndarray, colors: np.ndarray, blanked: np.ndarray, s_values: np.ndarray):
+        self._points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self._colors = np.asarray(colors, dtype=float).reshape(-1, 3)
+        self._blanked = np.asarray(blanked, dtype=bool).reshape(-1)
+        self._s_values = np.asarray(s_values, dtype=float).reshape(-1)
+        if not (len(self._points) == len(self._colors) == len(self._blanked) == len(self._s_values)):
+            raise ValueError("points, colors, blanked and s_values must have the same length")
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def copy(self) -> PointStream:
+        return PointStream(self._points.copy(), self._colors.copy(), self._blanked.copy(), self._s_values.copy())
+
+    def blank(self, mask: np.ndarray | None = None):
+        if mask is None:
+            self._blanked[:] = True
+        else:
+            self._blanked |= mask
+
+    def flip_x(self):
+        self._points[:, 0] = -self._points[:, 0]
+
+    def flip_y(self):
+        self._points[:, 1] = -self._points[:, 1]
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points
+
+    @property
+    def colors(self) -> np.ndarray:
+        return self._colors
+
+    @property
+    def blanked(self) -> np.ndarray:
+        return self._blanked
+
+    @property
+    def s_values(self) -> np.ndarray:
+        return self._s_values
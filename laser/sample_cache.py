@@ -0,0 +1,114 @@
+from __future__ import annotations
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+Samples = Tuple[np.ndarray, np.ndarray, np.ndarray]
+# process id, hits and misses of a process's cache
+SampleCacheStats = Tuple[int, int, int]
+
+
+class SampleCache:
+
+    DEFAULT_MAX_ENTRIES: int = 512
+
+    _max_entries: int
+    _entries: OrderedDict[Hashable, Samples]
+
+    _hits: int
+    _misses: int
+
+    def __init__(self, max_entries: int | None = None):
+        self._max_entries = self.DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Samples | None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return self._entries[key]
+        self._misses += 1
+        return None
+
+    def put(self, key: Hashable, samples: Samples):
+        # the samples are shared by every later shape with the same key
+        for array in samples:
+            array.flags.writeable = False
+        self._entries[key] = samples
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self._hits + self._misses
+        return self._hits / lookups if lookups > 0 else 0.0
+
+
+# one cache per process, so every pool worker keeps its own
+_sample_cache = SampleCache()
+
+
+def get_sample_cache() -> SampleCache:
+    return _sample_cache
+
+
+def configure_sample_cache(max_entries: int | None = None):
+    global _sample_cache
+    _sample_cache = SampleCache(max_entries)
+
+
+def sample_cache_stats() -> SampleCacheStats:
+    return os.getpid(), _sample_cache.hits, _sample_cache.misses
+
+
+class WithSampleCacheStats:
+
+    _function: Callable[..., Any]
+
+    def __init__(self, function: Callable[..., Any]):
+        self._function = function
+
+    def __call__(self, *args: Any) -> Tuple[Any, SampleCacheStats]:
+        return self._function(*args), sample_cache_stats()
+
+
+class SampleCacheReport:
+
+    _workers: Dict[int, Tuple[int, int]]
+
+    def __init__(self):
+        self._workers = {}
+
+    def update(self, stats: SampleCacheStats):
+        # the counters only grow within a worker, so the largest ones are its latest
+        pid, hits, misses = stats
+        if hits + misses >= sum(self._workers.get(pid, (0, 0))):
+            self._workers[pid] = (hits, misses)
+
+    def lines(self) -> List[str]:
+        lines = []
+        for pid, (hits, misses) in sorted(self._workers.items()):
+            lookups = hits + misses
+            hit_rate = hits / lookups if lookups > 0 else 0.0
+            lines.append(f"Sample cache of worker {pid}: {hits}/{lookups} hits ({hit_rate:.1%})")
+        return lines
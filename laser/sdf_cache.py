@@ -0,0 +1,112 @@
+from __future__ import annotations
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from typing import Any
+
+
+class SdfCache:
+
+    DEFAULT_MAX_ENTRIES: int = 256
+    FILE_EXTENSION: str = ".pickle"
+
+    _max_entries: int
+    _directory: str | None
+    _entries: OrderedDict[str, Any]
+
+    _hits: int
+    _misses: int
+
+    def __init__(self, directory: str | None = None, max_entries: int | None = None):
+        self._max_entries = self.DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+        self._directory = directory
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+        if self._directory is not None:
+            os.makedirs(self._directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + self.FILE_EXTENSION)
+
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Any | None:
+        if self._directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # a broken entry is recomputed and overwritten
+            return None
+
+    def _dump(self, key: str, value: Any):
+        # write to a temporary file first so concurrent workers never read partial entries
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self._path(key))
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def get(self, key: str) -> Any | None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return self._entries[key]
+
+        value = self._load(key)
+        if value is None:
+            self._misses += 1
+            return None
+        self._remember(key, value)
+        self._hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        self._remember(key, value)
+        if self._directory is not None:
+            self._dump(key, value)
+
+    def clear(self):
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def directory(self) -> str | None:
+        return self._directory
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+
+_sdf_cache = SdfCache()
+
+
+def get_sdf_cache() -> SdfCache:
+    return _sdf_cache
+
+
+def configure_sdf_cache(directory: str | None = None, max_entries: int | None = None):
+    global _sdf_cache
+    _sdf_cache = SdfCache(directory, max_entries)
@@ -1,4 +1,4 @@
-from laser.shapes.shape import Shape, Displacement
+from laser.shapes.shape import Shape, Displacement, BatchedDisplacement
 from laser.shapes.circle import Circle
 from laser.shapes.ellipse import Ellipse
 from laser.shapes.line import Line
@@ -2,7 +2,6 @@ import numpy as np
 
 from laser.color import ColorGradient
 from laser.shapes.ellipse import Ellipse
-from util import ensure_np_array
 
 
 class Circle(Ellipse):
@@ -16,20 +15,13 @@ class Circle(Ellipse):
     ):
         super().__init__(center, np.array([radius, radius]), color_gradient, point_density)
         
-    @ensure_np_array
-    def signed_distance(self, p: np.ndarray) -> float:
-        p_t = self._inv_transform(p)
-        v = p_t - self._center
-        d_c = np.linalg.norm(v)
-        return d_c - self._radii[0]
+    def signed_distances(self, points: np.ndarray) -> np.ndarray:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        return np.linalg.norm(points - self._center, axis=1) - self._radii[0]
 
-    @ensure_np_array
-    def nearest_point(self, p: np.ndarray) -> np.ndarray:
-        p_t = self._inv_transform(p)
-        v = p_t - self._center
-        d_c = np.linalg.norm(v)
-        if d_c == 0:
-            q = self._center + self._radii[0] * np.array([1.0, 0.0])
-        else:
-            q = self._center + self._radii[0] * v / d_c
-        return q
\ No newline at end of file
+    def nearest_points(self, points: np.ndarray) -> np.ndarray:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        v = points - self._center
+        d_c = np.linalg.norm(v, axis=1)[:, np.newaxis]
+        directions = np.where(d_c == 0, np.array([1.0, 0.0]), v / np.where(d_c == 0, 1.0, d_c))
+        return self._transform(self._center + self._radii[0] * directions)
@@ -1,8 +1,8 @@
 import numpy as np
 from math import pi, sqrt
+from functools import lru_cache
 from typing import List, Tuple
-from scipy.optimize import minimize
-from util import np_cache, ensure_np_array
+from util import ensure_np_array, memoize
 
 from laser.color import ColorGradient, Color
 from laser.shapes.shape import Shape
@@ -10,6 +10,9 @@ from laser.shapes.shape import Shape
 
 class Ellipse(Shape):
 
+    ARC_LENGTH_TABLE_SIZE: int = 1024
+    NEWTON_ITERATIONS: int = 12
+
     _center: np.ndarray
     _radii: np.ndarray
 
@@ -21,46 +24,78 @@ class Ellipse(Shape):
         point_density: float | None = None
     ):
         super().__init__(color_gradient, point_density)
-        self._center = center
-        self._radii = radii
+        self._center = self._frozen(center)
+        self._radii = self._frozen(radii)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _arc_length_table(radius_x: float, radius_y: float) -> Tuple[np.ndarray, np.ndarray]:
+        angles = np.linspace(0.0, 2.0 * pi, Ellipse.ARC_LENGTH_TABLE_SIZE + 1)
+        speeds = np.hypot(radius_x * np.sin(angles), radius_y * np.cos(angles))
+        lengths = np.concatenate([[0.0], np.cumsum(0.5 * (speeds[1:] + speeds[:-1]) * np.diff(angles))])
+        return angles, lengths
+
+    def _is_circle(self) -> bool:
+        return self._radii[0] == self._radii[1]
+
+    def _circumference(self) -> float:
+        if self._is_circle():
+            return 2.0 * pi * abs(self._radii[0])
+        _, lengths = self._arc_length_table(float(self._radii[0]), float(self._radii[1]))
+        return lengths[-1]
+
+    def _angles_by_s(self, s: float | np.ndarray) -> float | np.ndarray:
+        if self._is_circle():
+            return 2.0 * pi * s
+        angles, lengths = self._arc_length_table(float(self._radii[0]), float(self._radii[1]))
+        return np.interp(s * lengths[-1], lengths, angles)
+
+    def _compute_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        spacing = 1.0 / (self._point_density * self.ILDX_RESOLUTION)
+        n_points = max(int(round(self._circumference() / spacing)), 1)
 
-    def _compute_points(self) -> Tuple[List[np.ndarray], List[Color], List[float]]:
-        cirumference = pi * (3.0 * (self._radii[0] + self._radii[1]) - sqrt((3 * self._radii[0] + self._radii[1]) * (self._radii[0] + 3.0 * self._radii[1])))
+        s_values = np.arange(n_points + 1) / n_points
+        angles = self._angles_by_s(s_values)
+        points = self._center + self._radii * np.column_stack([np.cos(angles), np.sin(angles)])
+        points[-1] = points[0]
 
-        spacing = 1.0 / (self._point_density * self.ILDX_RESOLUTION)
-        n_points = int(round(cirumference / spacing))
-        
-        points = []
-        colors = []
-        ts = []
-        accumulated_length = 0.0
-        segment_length = 0.0
-        previous_point = None
-
-        for i in range(n_points):
-            angle = (2.0 * pi * i) / n_points
-            x = self._center[0] + self._radii[0] * np.cos(angle)
-            y = self._center[1] + self._radii[1] * np.sin(angle)
-
-            if previous_point is not None:
-                dx = x - previous_point[0]
-                dy = y - previous_point[1]
-                segment_length = sqrt(dx * dx + dy * dy)
-                accumulated_length += segment_length
-
-            t = accumulated_length / cirumference
-            previous_point = np.array([x, y])
-
-            points.append(np.array([x, y]))
-            colors.append(self._color_gradient.get_color(t))
-            ts.append(t)
-
-        points.append(points[0])
-        colors.append(colors[0])
-        ts.append(1)
-
-        return points, colors, ts
+        return points, self._color_gradient.get_colors(s_values), s_values
     
+    def _geometry_key(self) -> bytes | None:
+        return np.ascontiguousarray(np.concatenate([self._center, self._radii]), dtype=float).tobytes()
+
+    def bounding_box(self) -> Tuple[np.ndarray, np.ndarray]:
+        matrix = self.matrix
+        if not np.allclose(matrix[2], [0.0, 0.0, 1.0]):
+            return super().bounding_box()
+        # the image of the ellipse is center + M diag(r) (cos, sin), whose extent per axis
+        # is the norm of the corresponding row of M diag(r)
+        center = self._transform(self._center)
+        extents = np.linalg.norm(matrix[:2, :2] * self._radii, axis=1)
+        return center - extents, center + extents
+
+    def _line_crossings(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        starts = self._inv_transform(np.asarray(starts, dtype=float).reshape(-1, 2))
+        ends = self._inv_transform(np.asarray(ends, dtype=float).reshape(-1, 2))
+        directions = (ends - starts) / self._radii
+        offsets = (starts - self._center) / self._radii
+
+        A = np.sum(directions ** 2, axis=1)
+        B = 2 * np.sum(offsets * directions, axis=1)
+        C = np.sum(offsets ** 2, axis=1) - 1
+        discriminants = B ** 2 - 4 * A * C
+        valid = (A > 0) & (discriminants >= 0)
+        roots = np.sqrt(np.where(valid, discriminants, 0.0))
+        safe_A = np.where(valid, A, 1.0)
+
+        indices, ts = [], []
+        for t in ((-B - roots) / (2 * safe_A), (-B + roots) / (2 * safe_A)):
+            hits = valid & (t >= 0) & (t <= 1)
+            indices.append(np.nonzero(hits)[0])
+            ts.append(t[hits])
+        return np.concatenate(indices), np.concatenate(ts)
+
+    @memoize()
     @ensure_np_array
     def is_line_inside(self, p0: np.ndarray, p1: np.ndarray) -> bool:
         # check if endpoints are inside the ellipse
@@ -97,58 +132,73 @@ class Ellipse(Shape):
         r = np.linalg.norm(p_norm)
         return p_norm, r
 
-    @ensure_np_array
-    def signed_distance(self, p: np.ndarray) -> float:
-        p_t = self._inv_transform(p)
-        p_r = p_t - self._center
-        q = self.nearest_point(p)
-        return np.sign((p_r[0] / self._radii[0]) ** 2 + (p_r[1] / self._radii[1]) ** 2 - 1) * np.linalg.norm(p_r - q)
-
-    @np_cache
-    def nearest_point(self, p: np.ndarray) -> np.ndarray:
-        p_t = self._inv_transform(p)
-
-        def objective(theta: float) -> float:
-            x = self._center[0] + self._radii[0] * np.cos(theta)
-            y = self._center[1] + self._radii[1] * np.sin(theta)
-            return (x - p_t[0]) ** 2 + (y - p_t[1]) ** 2
-    
-        theta0 = np.arctan2(p_t[1] - self._center[1], p_t[0] - self._center[0])
-        result = minimize(objective, theta0, bounds=[(0, 2 * np.pi)])
-        theta_opt = result.x[0]
-        x = self._center[0] + self._radii[0] * np.cos(theta_opt)
-        y = self._center[1] + self._radii[1] * np.sin(theta_opt)
-        return np.array([x, y])
+    def _local_nearest_points(self, points: np.ndarray) -> np.ndarray:
+        offsets = points - self._center
+        signs = np.where(offsets < 0.0, -1.0, 1.0)
+        p = np.abs(offsets)
+        a, b = np.abs(self._radii)
+        if a < b:
+            p = p[:, ::-1]
+            a, b = b, a
+        x, y = p[:, 0], p[:, 1]
+
+        if a == b:
+            r = np.linalg.norm(p, axis=1)
+            q = np.where(r[:, np.newaxis] > 0.0, a * p / np.where(r > 0.0, r, 1.0)[:, np.newaxis], np.array([a, 0.0]))
+        else:
+            # q = (a^2 x / (t + a^2), b^2 y / (t + b^2)) where t is the root of
+            # F(t) = (a x / (t + a^2))^2 + (b y / (t + b^2))^2 - 1, which is convex and
+            # decreasing for t > -b^2, so Newton converges monotonically from F(t_0) >= 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.maximum(b * y - b * b, a * x - a * a)
+                for _ in range(self.NEWTON_ITERATIONS):
+                    u = a * x / (t + a * a)
+                    v = b * y / (t + b * b)
+                    f = u * u + v * v - 1.0
+                    df = -2.0 * (u * u / (t + a * a) + v * v / (t + b * b))
+                    t = np.where(df < 0.0, t - f / df, t)
+                qx = a * a * x / (t + a * a)
+                qy = b * b * y / (t + b * b)
+
+            # on the major axis the root can lie on the pole t = -b^2
+            on_axis = y <= 0.0
+            axis_qx = np.where(x < (a * a - b * b) / a, a * a * x / (a * a - b * b), a)
+            axis_qy = b * np.sqrt(np.maximum(1.0 - (axis_qx / a) ** 2, 0.0))
+            q = np.column_stack([
+                np.where(on_axis, axis_qx, qx),
+                np.where(on_axis, axis_qy, qy)
+            ])
+
+        if np.abs(self._radii[0]) < np.abs(self._radii[1]):
+            q = q[:, ::-1]
+        return self._center + signs * q
+
+    def signed_distances(self, points: np.ndarray) -> np.ndarray:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        p_r = (points - self._center) / self._radii
+        q = self._local_nearest_points(points)
+        return np.sign(np.sum(p_r ** 2, axis=1) - 1) * np.linalg.norm(points - q, axis=1)
+
+    def nearest_points(self, points: np.ndarray) -> np.ndarray:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        return self._transform(self._local_nearest_points(points))
         
     def point_by_s(self, s: float, t: float) -> np.ndarray:
-        if s < 0.0 or s > 1.0:
-            raise ValueError("t must be in the range [0, 1]")
-        
-        angle = 2.0 * pi * s
-        x = self._center[0] + self._radii[0] * np.cos(angle)
-        y = self._center[1] + self._radii[1] * np.sin(angle)
-        
-        point = np.array([x, y])
-        point = self._displace(self._transform(point), t, s)
-        return point
+        return self.points_by_s(np.array([s]), t)[0]
+
+    def points_by_s(self, s_values: np.ndarray, t: float) -> np.ndarray:
+        s_values = np.asarray(s_values, dtype=float).reshape(-1)
+        if np.any((s_values < 0.0) | (s_values > 1.0)):
+            raise ValueError("s must be in the range [0, 1]")
+
+        angles = self._angles_by_s(s_values)
+        points = self._center + self._radii * np.column_stack([np.cos(angles), np.sin(angles)])
+        return self._displace(self._transform(points), s_values, t)
 
     def tangent(self, s: float) -> np.ndarray:
-        tangent_vector = np.array([
-            -self._radii[0] * np.sin(2.0 * pi * s),
-            self._radii[1] * np.cos(2.0 * pi * s)
-        ])
-        tangent_vector = self._transform(tangent_vector)
-        tangent_vector /= np.linalg.norm(tangent_vector)
-        return tangent_vector
-
-    def copy(self) -> Shape:
-        ellipse = Ellipse(
-            self._center.copy(),
-            self._radii.copy(),
-            self._color_gradient.copy(),
-            self._point_density
-        )
-        ellipse._transformations = [t.copy() for t in self._transformations]
-        ellipse._inverse_transformations = [t.copy() for t in self._inverse_transformations]
-        ellipse._displacements = self._displacements
-        return ellipse
+        return self.tangents(np.array([s]))[0]
+
+    def tangents(self, s_values: np.ndarray) -> np.ndarray:
+        angles = self._angles_by_s(np.asarray(s_values, dtype=float).reshape(-1))
+        tangent_vectors = self._transform_directions(self._radii * np.column_stack([-np.sin(angles), np.cos(angles)]))
+        return tangent_vectors / np.linalg.norm(tangent_vectors, axis=1)[:, np.newaxis]
@@ -2,7 +2,7 @@ import numpy as np
 
 from laser.color import ColorGradient, Color
 from laser.shapes.shape import Shape 
-from util import ensure_np_array
+from util import ensure_np_array, memoize
 
 from typing import List, Tuple
 
@@ -17,17 +17,33 @@ class Point(Shape):
         color_gradient: ColorGradient,
         point_density: float | None = None
     ):
-        self._point = point
+        self._point = self._frozen(point)
         self._tangent_noise = None
         super().__init__(color_gradient, point_density)
     
-    def _compute_points(self) -> Tuple[List[np.ndarray], List[Color], List[float]]:
+    def _compute_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        s_values = np.zeros(2)
         return (
-            [self._point, self._point], 
-            [self._color_gradient.get_color(0), self._color_gradient.get_color(0)], 
-            [0.0, 0.0]
+            np.array([self._point, self._point], dtype=float), 
+            self._color_gradient.get_colors(s_values), 
+            s_values
         )
     
+    def _encloses_area(self) -> bool:
+        return False
+
+    def _line_crossings(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        starts = self._inv_transform(np.asarray(starts, dtype=float).reshape(-1, 2))
+        ends = self._inv_transform(np.asarray(ends, dtype=float).reshape(-1, 2))
+        directions = ends - starts
+        offsets = np.asarray(self._point, dtype=float) - starts
+        crosses = directions[:, 0] * offsets[:, 1] - directions[:, 1] * offsets[:, 0]
+        squared_lengths = np.sum(directions ** 2, axis=1)
+        t = np.sum(offsets * directions, axis=1) / np.where(squared_lengths > 0, squared_lengths, 1.0)
+        hits = (crosses == 0) & (squared_lengths > 0) & (t >= 0) & (t <= 1)
+        return np.nonzero(hits)[0], t[hits]
+
+    @memoize()
     @ensure_np_array
     def is_line_inside(self, p0: np.ndarray, p1: np.ndarray) -> bool:
         p0_t = self._inv_transform(p0)
@@ -44,28 +60,23 @@ class Point(Shape):
     def is_line_outside(self, p0: np.ndarray, p1: np.ndarray) -> bool:
         return not self.is_line_inside(p0, p1)
     
-    @ensure_np_array
-    def signed_distance(self, p: np.ndarray, t: float) -> float:
-        p_t = self._inv_transform(p)
-        return np.linalg.norm(p_t - self._point)
+    def _geometry_key(self) -> bytes | None:
+        return np.ascontiguousarray(self._point, dtype=float).tobytes()
+
+    def bounding_box(self) -> Tuple[np.ndarray, np.ndarray]:
+        point = self._transform(np.asarray(self._point, dtype=float))
+        return point, point.copy()
+
+    def signed_distances(self, points: np.ndarray) -> np.ndarray:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        return np.linalg.norm(points - self._point, axis=1)
     
-    @ensure_np_array
-    def nearest_point(self, p: np.ndarray, t: float) -> np.ndarray:
-        return self._transform(self._point)
+    def nearest_points(self, points: np.ndarray) -> np.ndarray:
+        n_points = len(np.asarray(points).reshape(-1, 2))
+        return np.repeat(self._transform(self._point)[np.newaxis], n_points, axis=0)
 
     def point_by_s(self, s: float, t: float) -> np.ndarray:
-        return self._displace(self._transform(self._point), t, s)
+        return self._displace_point(self._transform(self._point), s, t)
     
     def tangent(self, s: float) -> np.ndarray:
-        np.array([0.0, 0.0])
-
-    def copy(self) -> Shape:
-        point = Point(
-            self._point.copy(), 
-            self._color_gradient.copy(),
-            self._point_density
-        )
-        point._transformations = [t.copy() for t in self._transformations]
-        point._inverse_transformations = [t.copy() for t in self._inverse_transformations]
-        point._displacements = self._displacements
-        return point 
+        return np.array([0.0, 0.0])
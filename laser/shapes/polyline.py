@@ -1,31 +1,43 @@
 from __future__ import annotations
 import numpy as np
 from typing import List, Tuple, Callable
-from math import sqrt
-from itertools import chain
-from util import np_cache, ensure_np_array
-from functools import cache
+from util import ensure_np_array, memoize, clear_memos
 
 from laser.color import ColorGradient, Color
 from laser.shapes.shape import Shape
+from laser.shapes.segment_index import SegmentIndex
 
 
 class Polyline(Shape):
 
     DEFAULT_PARAMETRIC_STEP_SIZE: float = 0.01
+    QUERY_CHUNK_ELEMENTS: int = 2 ** 20
+    SEGMENT_INDEX_THRESHOLD: int = 64
 
-    _points: List[np.ndarray]
+    _points: np.ndarray
     _closed: bool
+    _segment_index: SegmentIndex | None
 
     _total_length: float
+    _accumulated_lengths: np.ndarray
 
     @classmethod
-    def from_sdf(cls, sdf: Callable[[np.ndarray], float], color_gradient: ColorGradient, point_density: float | None = None) -> List[Polyline]:
+    def from_sdf(
+        cls, 
+        sdf: Callable[[np.ndarray], float], 
+        color_gradient: ColorGradient, 
+        point_density: float | None = None,
+        batched: bool = False,
+        cache_key: str | None = None
+    ) -> List[Polyline]:
         dummy_shape = cls(
             [np.array([1.0, 0.0]), np.array([0.0, 1.0])], False, 
             color_gradient, point_density
         )
-        return dummy_shape._combine_shapes(None, sdf, color_gradient)
+        return dummy_shape._combine_shapes(
+            None, sdf, color_gradient, batched,
+            cache_key=None if cache_key is None else ('from_sdf', cache_key)
+        )
     
     @classmethod
     def from_parametric_equation(
@@ -52,118 +64,74 @@ class Polyline(Shape):
         point_density: float | None = None
     ):
         super().__init__(color_gradient, point_density)
-        self._points = points
+        self._points = self._frozen(np.reshape(points, (-1, 2)))
         self._closed = closed
 
+        self._invalidate_geometry()
+
+    def _invalidate_geometry(self):
+        self._segment_index = None
         self._compute_total_length()
+        clear_memos(self)
 
     def _compute_total_length(self):
-        self._total_length = 0.0
-        for i in range(1, len(self._points)):
-            (x1, y1) = self._points[i - 1]
-            (x2, y2) = self._points[i]
-            self._total_length += sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-
-        if self._closed:
-            (x1, y1) = self._points[-1]
-            (x2, y2) = self._points[0]
-            self._total_length += sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        vertices = np.vstack([self._points, self._points[:1]]) if self._closed else self._points
+        segment_lengths = np.linalg.norm(np.diff(vertices, axis=0), axis=1)
+        self._accumulated_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+        self._total_length = float(self._accumulated_lengths[-1])
+
+    @staticmethod
+    def _resample(vertices: np.ndarray, closed: bool, spacing: float) -> Tuple[np.ndarray, np.ndarray]:
+        if closed:
+            vertices = np.vstack([vertices, vertices[:1]])
+        deltas = np.diff(vertices, axis=0)
+        segment_lengths = np.linalg.norm(deltas, axis=1)
+        accumulated_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+
+        # every segment is split into n_interior + 1 equally long pieces, keeping the vertices
+        n_interior = np.where(segment_lengths > spacing, np.rint(segment_lengths / spacing), 0).astype(int)
+        n_pieces = n_interior + 1
+        segment_indices = np.repeat(np.arange(len(deltas)), n_pieces)
+        piece_indices = np.arange(len(segment_indices)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        ratios = piece_indices / n_pieces[segment_indices]
+
+        points = np.vstack([
+            vertices[segment_indices] + ratios[:, np.newaxis] * deltas[segment_indices],
+            vertices[-1:]
+        ])
+        lengths = np.concatenate([
+            accumulated_lengths[segment_indices] + ratios * segment_lengths[segment_indices],
+            accumulated_lengths[-1:]
+        ])
+
+        total_length = accumulated_lengths[-1]
+        s_values = lengths / total_length if total_length > 0.0 else np.zeros(len(lengths))
+        return points, s_values
     
-    def _compute_points(self) -> Tuple[List[np.ndarray], List[Color], List[float]]:
+    def _compute_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         spacing = 1.0 / (self._point_density * self.ILDX_RESOLUTION)
+        points, s_values = self._resample(self._points, self._closed, spacing)
+        return points, self._color_gradient.get_colors(s_values), s_values
 
-        points = [self._points[0]]
-        colors = [self._color_gradient.get_color(0.0)]
-        ts = [0.0]
-        accumulated_length = 0.0
-        
-        for i in range(1, len(self._points)):
-            (x1, y1) = self._points[i - 1]
-            (x2, y2) = self._points[i]
-
-            segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-
-            if segment_length > spacing:
-                n_points = int(round(segment_length / spacing))
-                dx = (x2 - x1) / (n_points + 1)
-                dy = (y2 - y1) / (n_points + 1)
-
-                for j in range(1, n_points + 1):
-                    new_x = x1 + j * dx
-                    new_y = y1 + j * dy
-
-                    accumulated_length += sqrt(dx ** 2 + dy ** 2) 
-                    t = accumulated_length / self._total_length
-
-                    points.append(np.array([new_x, new_y]))
-                    colors.append(self._color_gradient.get_color(t))
-                    ts.append(t)
-            else:
-                accumulated_length += segment_length
-                
-            t = accumulated_length / self._total_length
-
-            points.append(np.array([x2, y2]))
-            colors.append(self._color_gradient.get_color(t))
-            ts.append(t)
-
-        if self._closed:
-            (x1, y1) = self._points[-1]
-            (x2, y2) = self._points[0]
-
-            segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            if segment_length > spacing:
-                n_points = int(round(segment_length / spacing))
-                dx = (x2 - x1) / (n_points + 1)
-                dy = (y2 - y1) / (n_points + 1)
-
-                for j in range(1, n_points + 1):
-                    new_x = x1 + j * dx
-                    new_y = y1 + j * dy
-
-                    accumulated_length += sqrt(dx ** 2 + dy ** 2) * j
-                    t = accumulated_length / self._total_length
-
-                    points.append(np.array([new_x, new_y]))
-                    colors.append(self._color_gradient.get_color(t))
-                    ts.append(t)
-
-            accumulated_length += segment_length
-            if self._total_length == 0.0:
-                t = 0.0
-            else:
-                t = accumulated_length / self._total_length
-
-            points.append(np.array([x2, y2]))
-            colors.append(self._color_gradient.get_color(t))
-            ts.append(t)
-
-        return points, colors, ts
-
-    def _orientation(self, p0: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> int:
+    def _orientation(self, p0: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
         """
-        Return the orientation of the triplet (p0, p1, p2):
+        Return the orientation of the triplets (p0, p1, p2), broadcast over leading axes:
         -1 -> Clockwise
         0 -> Collinear
         1 -> Counterclockwise
         """
-        val = (p1[1] - p0[1]) * (p2[0] - p1[0]) - (p2[1] - p1[1]) * (p1[0] - p0[0])
-        if val > 0:
-            return 1  # Counterclockwise
-        elif val < 0:
-            return -1  # Clockwise
-        else:
-            return 0  # Collinear
+        val = (p1[..., 1] - p0[..., 1]) * (p2[..., 0] - p1[..., 0]) - (p2[..., 1] - p1[..., 1]) * (p1[..., 0] - p0[..., 0])
+        return np.sign(val).astype(int)
 
-    def _do_lines_intersect(self, p0: np.ndarray, p1: np.ndarray, q0: np.ndarray, q1: np.ndarray) -> bool:
+    def _do_lines_intersect(self, p0: np.ndarray, p1: np.ndarray, q0: np.ndarray, q1: np.ndarray) -> np.ndarray:
         """
-        Return True if the line segments p0p1 and q0q1 intersect.
+        Return whether the line segments p0p1 and q0q1 intersect, broadcast over leading axes.
         """
-        def _on_segment(p: np.ndarray, q: np.ndarray, r: np.ndarray) -> bool:
+        def _on_segment(p: np.ndarray, q: np.ndarray, r: np.ndarray) -> np.ndarray:
             """
             Check if point q lies on the segment pr (assumes q is collinear with pr).
             """
-            return min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and min(p[1], r[1]) <= q[1] <= max(p[1], r[1])
+            return np.all((np.minimum(p, r) <= q) & (q <= np.maximum(p, r)), axis=-1)
 
         # Calculate orientation values
         o1 = self._orientation(p0, p1, q0)
@@ -172,206 +140,221 @@ class Polyline(Shape):
         o4 = self._orientation(q0, q1, p1)
 
         # General case: the segments intersect if the orientations are different
-        if o1 != o2 and o3 != o4:
-            return True
+        return (
+            (o1 != o2) & (o3 != o4)
+            # Collinear cases: check if one segment's endpoint lies on the other segment
+            | (o1 == 0) & _on_segment(p0, q0, p1)
+            | (o2 == 0) & _on_segment(p0, q1, p1)
+            | (o3 == 0) & _on_segment(q0, p0, q1)
+            | (o4 == 0) & _on_segment(q0, p1, q1)
+        )
+    
+    def _geometry_key(self) -> bytes | None:
+        return bytes([self._closed]) + np.ascontiguousarray(self._points, dtype=float).tobytes()
 
-        # Collinear cases: check if one segment's endpoint lies on the other segment
-        if o1 == 0 and _on_segment(p0, q0, p1):
-            return True
-        if o2 == 0 and _on_segment(p0, q1, p1):
-            return True
-        if o3 == 0 and _on_segment(q0, p0, q1):
-            return True
-        if o4 == 0 and _on_segment(q0, p1, q1):
-            return True
+    def bounding_box(self) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self._points) == 0:
+            return super().bounding_box()
+        points = self._transform(self._points)
+        return np.min(points, axis=0), np.max(points, axis=0)
 
-        # No intersection
-        return False
-    
-    @ensure_np_array
-    def is_point_inside(self, p: np.ndarray) -> bool:
+    def _segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._closed:
+            return self._points, np.roll(self._points, -1, axis=0)
+        return self._points[:-1], self._points[1:]
+
+    def _get_segment_index(self) -> SegmentIndex | None:
+        starts, ends = self._segments()
+        if len(starts) < self.SEGMENT_INDEX_THRESHOLD:
+            return None
+        if self._segment_index is None:
+            self._segment_index = SegmentIndex(starts, ends)
+        return self._segment_index
+
+    def _query_chunks(self, n_queries: int, n_segments: int) -> List[slice]:
+        chunk_size = max(self.QUERY_CHUNK_ELEMENTS // max(n_segments, 1), 1)
+        return [slice(i, i + chunk_size) for i in range(0, n_queries, chunk_size)]
+
+    @staticmethod
+    def _winding_contributions(starts: np.ndarray, ends: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # orientation of the triplet (start, end, p), see _orientation
+        orientations = (ends[..., 1] - starts[..., 1]) * (x - ends[..., 0]) - (y - ends[..., 1]) * (ends[..., 0] - starts[..., 0])
+        upward = (starts[..., 1] <= y) & (ends[..., 1] > y) & (orientations > 0)
+        downward = (starts[..., 1] > y) & (ends[..., 1] <= y) & (orientations < 0)
+        return upward.astype(int) - downward.astype(int)
+
+    def _winding_numbers(self, points: np.ndarray) -> np.ndarray:
+        starts, ends = self._segments()
+        segment_index = self._get_segment_index()
+        if segment_index is not None:
+            # only segments spanning the row of a point can cross its horizontal ray
+            owners, segments = segment_index.row_candidates(points)
+            contributions = self._winding_contributions(starts[segments], ends[segments], points[owners, 0], points[owners, 1])
+            return np.bincount(owners, weights=contributions, minlength=len(points)).astype(int)
+
+        winding_numbers = np.zeros(len(points), dtype=int)
+        for chunk in self._query_chunks(len(points), len(starts)):
+            x = points[chunk, 0, np.newaxis]
+            y = points[chunk, 1, np.newaxis]
+            winding_numbers[chunk] = np.sum(self._winding_contributions(starts, ends, x, y), axis=1)
+        return winding_numbers
+
+    def _encloses_area(self) -> bool:
+        return self._closed
+
+    def _line_crossings(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        starts = self._inv_transform(np.asarray(starts, dtype=float).reshape(-1, 2))
+        ends = self._inv_transform(np.asarray(ends, dtype=float).reshape(-1, 2))
+        edge_starts, edge_ends = self._segments()
+        directions = ends - starts
+        edges = edge_ends - edge_starts
+
+        segment_index = self._get_segment_index()
+        if segment_index is not None:
+            rows, columns = segment_index.box_candidates(np.minimum(starts, ends), np.maximum(starts, ends))
+            t, u, parallel = self._crossing_parameters(starts[rows], directions[rows], edge_starts[columns], edges[columns])
+            hits = ~parallel & (t >= 0.0) & (t <= 1.0) & (u >= 0.0) & (u <= 1.0)
+            return rows[hits], t[hits]
+
+        indices, ts = [np.empty(0, dtype=int)], [np.empty(0)]
+        for chunk in self._query_chunks(len(starts), len(edge_starts)):
+            t, u, parallel = self._crossing_parameters(
+                starts[chunk, np.newaxis, :], directions[chunk, np.newaxis, :], edge_starts, edges
+            )
+            hits = ~parallel & (t >= 0.0) & (t <= 1.0) & (u >= 0.0) & (u <= 1.0)
+            rows, _ = np.nonzero(hits)
+            indices.append(rows + chunk.start)
+            ts.append(t[hits])
+        return np.concatenate(indices), np.concatenate(ts)
+
+    @staticmethod
+    def _crossing_parameters(
+        starts: np.ndarray,
+        directions: np.ndarray,
+        edge_starts: np.ndarray,
+        edges: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # solve starts + t * directions = edge_starts + u * edges
+        offsets = edge_starts - starts
+        denominators = directions[..., 0] * edges[..., 1] - directions[..., 1] * edges[..., 0]
+        parallel = denominators == 0.0
+        safe_denominators = np.where(parallel, 1.0, denominators)
+        t = (offsets[..., 0] * edges[..., 1] - offsets[..., 1] * edges[..., 0]) / safe_denominators
+        u = (offsets[..., 0] * directions[..., 1] - offsets[..., 1] * directions[..., 0]) / safe_denominators
+        return t, u, parallel
+
+    def are_points_inside(self, points: np.ndarray) -> np.ndarray:
         if not self._closed:
-            return super().is_point_inside(p)
-        
-        winding_number = 0
-        n = len(self._points)
-
-        for i in range(n):
-            p0 = self._points[i]
-            p1 = self._points[(i + 1) % n]
-            if p0[1] <= p[1]:
-                if p1[1] > p[1] and self._orientation(p0, p1, p) == 1:
-                    winding_number += 1
-            else:
-                if p1[1] <= p[1] and self._orientation(p0, p1, p) == -1:
-                    winding_number -= 1
-
-        return winding_number != 0
+            return super().are_points_inside(points)
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        return self._winding_numbers(points) != 0
         
-    @np_cache
+    @memoize()
     @ensure_np_array
     def is_line_inside(self, p0: np.ndarray, p1: np.ndarray) -> bool:
-        line_segments = (
-            (self._points[i - 1], self._points[i]) 
-            for i in range(1, len(self._points))
-        )
-
-        if self._closed:
-            line_segments = chain(line_segments, [(self._points[-1], self._points[0])])
-            if self.is_point_inside(p0) or self.is_point_inside(p1):
-                return True
-            for (q0, q1) in line_segments:
-                if self._do_lines_intersect(p0, p1, q0, q1):
-                    return True
-            return False
-        
-        else:
-            for (q0, q1) in line_segments:
-                if self._do_lines_intersect(p0, p1, q0, q1):
-                    return True
-            return False
+        p0 = self._inv_transform(p0)
+        p1 = self._inv_transform(p1)
+        if self._closed and np.any(self._winding_numbers(np.array([p0, p1])) != 0):
+            return True
+        starts, ends = self._segments()
+        segment_index = self._get_segment_index()
+        if segment_index is not None:
+            _, segments = segment_index.box_candidates(np.minimum(p0, p1)[np.newaxis], np.maximum(p0, p1)[np.newaxis])
+            starts, ends = starts[segments], ends[segments]
+        return bool(np.any(self._do_lines_intersect(p0, p1, starts, ends)))
     
     @ensure_np_array
     def is_line_outside(self, p0: np.ndarray, p1: np.ndarray) -> bool:
         return not self.is_line_inside(p0, p1)
     
-    @np_cache
-    @ensure_np_array
-    def _nearest_point_and_distance(self, p: np.ndarray) -> Tuple[np.ndarray, float]:
-        p = self._inv_transform(p)
-        line_segments = (
-            (self._points[i - 1], self._points[i]) 
-            for i in range(1, len(self._points))
-        )
-        best_p = None
-        best_distance = float("inf")
-        for (p_0, p_1) in chain(line_segments, [(self._points[-1], self._points[0])] if self._closed else []):
-            t = (p - p_0).dot(p_1 - p_0) / np.linalg.norm(p_1 - p_0) ** 2
-            t = np.clip(t, 0.0, 1.0)
-            q = p_0 + t * (p_1 - p_0)
-            if t == 0.0:
-                q = p_0
-            elif t == 1.0:
-                q = p_1       
-            distance = np.linalg.norm(p - q)
-            if distance < best_distance:
-                best_distance = distance
-                best_p = q
-        return self._transform(best_p), best_distance
+    @memoize()
+    def _nearest_points_and_distances(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        points = self._inv_transform(np.asarray(points, dtype=float).reshape(-1, 2))
+        segment_index = self._get_segment_index()
+        if segment_index is not None:
+            nearest_points, distances = segment_index.nearest(points)
+            return self._transform(nearest_points), distances
+
+        starts, ends = self._segments()
+        if len(starts) == 0:
+            starts, ends = self._points, self._points
+        deltas = ends - starts
+        squared_lengths = np.sum(deltas ** 2, axis=1)
+        squared_lengths = np.where(squared_lengths > 0.0, squared_lengths, 1.0)
+
+        nearest_points = np.empty_like(points)
+        distances = np.empty(len(points))
+        for chunk in self._query_chunks(len(points), len(starts)):
+            offsets = points[chunk, np.newaxis, :] - starts
+            t = np.clip(np.sum(offsets * deltas, axis=2) / squared_lengths, 0.0, 1.0)
+            candidates = starts + t[..., np.newaxis] * deltas
+            candidate_distances = np.linalg.norm(points[chunk, np.newaxis, :] - candidates, axis=2)
+            best = np.argmin(candidate_distances, axis=1)
+            rows = np.arange(len(best))
+            nearest_points[chunk] = candidates[rows, best]
+            distances[chunk] = candidate_distances[rows, best]
+        return self._transform(nearest_points), distances
     
-    @ensure_np_array
-    def signed_distance(self, p: np.ndarray) -> float:
-        distance = self._nearest_point_and_distance(p)[1]
-        if self._closed and self.is_point_inside(p):
-            return -distance
-        return distance
-        
-    @ensure_np_array
-    def nearest_point(self, p: np.ndarray) -> np.ndarray:
-        return self._nearest_point_and_distance(p)[0]
-
-    @cache
-    def point_by_s(self, s: float, t: float) -> np.ndarray:       
-        if s == 1.0:
-            p = self._points[-1]
-        else:
-            accumulated_length = 0.0
-            for i in range(1, len(self._points)):
-                (x1, y1) = self._points[i - 1]
-                (x2, y2) = self._points[i]
-
-                segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-                accumulated_length += segment_length
-
-                if s * self._total_length <= accumulated_length:
-                    p = np.array([x1 + (x2 - x1) * s, y1 + (y2 - y1) * s])
-                
-            if self._closed:
-                (x1, y1) = self._points[-1]
-                (x2, y2) = self._points[0]
-
-                segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-                accumulated_length += segment_length
-
-                if s * self._total_length <= accumulated_length:
-                    p = np.array([x1 + (x2 - x1) * s, y1 + (y2 - y1) * s])
-
-        return self._displace(self._transform(p), t, s)
-                
-    def _find_line_segment_index(self, s: float) -> Tuple[int, float]:
-        accumulated_length = 0.0
-        for i in range(1, len(self._points)):
-            (x1, y1) = self._points[i - 1]
-            (x2, y2) = self._points[i]
-
-            segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            accumulated_length += segment_length
-
-            if s * self._total_length <= accumulated_length:
-                return i - 1
-
+    def signed_distances(self, points: np.ndarray) -> np.ndarray:
+        _, distances = self._nearest_points_and_distances(points)
         if self._closed:
-            (x1, y1) = self._points[-1]
-            (x2, y2) = self._points[0]
+            return np.where(self.are_points_inside(points), -distances, distances)
+        return distances
+        
+    def nearest_points(self, points: np.ndarray) -> np.ndarray:
+        return self._nearest_points_and_distances(points)[0]
 
-            segment_length = sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-            accumulated_length += segment_length
+    def point_by_s(self, s: float, t: float) -> np.ndarray:
+        return self.points_by_s(np.array([s]), t)[0]
 
-            if s * self._total_length <= accumulated_length:
-                return len(self._points) - 1
+    def points_by_s(self, s_values: np.ndarray, t: float) -> np.ndarray:
+        s_values = np.asarray(s_values, dtype=float).reshape(-1)
+        starts, ends = self._segments()
+        if len(starts) == 0:
+            points = np.repeat(self._points[:1], len(s_values), axis=0)
+        else:
+            indices = self._find_line_segment_indices(s_values)
+            segment_lengths = np.diff(self._accumulated_lengths)[indices]
+            ratios = np.where(
+                segment_lengths > 0.0,
+                (s_values * self._total_length - self._accumulated_lengths[indices]) / np.where(segment_lengths > 0.0, segment_lengths, 1.0),
+                0.0
+            )
+            ratios = np.clip(ratios, 0.0, 1.0)[:, np.newaxis]
+            points = starts[indices] + ratios * (ends[indices] - starts[indices])
+        return self._displace(self._transform(points), s_values, t)
+
+    def _find_line_segment_indices(self, s_values: np.ndarray) -> np.ndarray:
+        # index of the first segment that ends at or after s
+        indices = np.searchsorted(self._accumulated_lengths, s_values * self._total_length, side='left') - 1
+        return np.clip(indices, 0, len(self._accumulated_lengths) - 2)
+
+    def _find_line_segment_index(self, s: float) -> int:
+        return int(self._find_line_segment_indices(np.array([s]))[0])
+
+    def _vertex_tangents(self) -> np.ndarray:
+        if len(self._points) < 2:
+            return np.zeros_like(self._points)
+        previous_points = np.roll(self._points, 1, axis=0)
+        next_points = np.roll(self._points, -1, axis=0)
+        v01 = self._points - previous_points
+        v12 = next_points - self._points
+        w01 = np.linalg.norm(v01, axis=1)[:, np.newaxis]
+        w12 = np.linalg.norm(v12, axis=1)[:, np.newaxis]
+        tangents = (w01 * v01 + w12 * v12) / (w01 + w12)
+        if not self._closed:
+            tangents[0] = self._points[1] - self._points[0]
+            tangents[-1] = self._points[-1] - self._points[-2]
+        return tangents
 
-        return -1
-    
-    def _two_point_tangent(self, p0: np.ndarray, p1: np.ndarray) -> np.ndarray:
-        return (p1 - p0) 
-    
-    def _three_point_tangent(self, p0: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
-        v01 = p1 - p0
-        v12 = p2 - p1
-        w01 = np.linalg.norm(v01)
-        w12 = np.linalg.norm(v12)
-        return (w01 * v01 + w12 * v12) / (w01 + w12)
-
-    @cache
     def tangent(self, s: float) -> np.ndarray:
-        i = self._find_line_segment_index(s)
-        if s == 0.0:
-            if i == 0 and not self._closed:
-                v = self._two_point_tangent(self._points[0], self._points[1])
-            else:
-                v = self._three_point_tangent(self._points[-1], self._points[0], self._points[1])
-        elif s == 1.0:
-            if i == len(self._points) - 1 and not self._closed:
-                v = self._two_point_tangent(self._points[-2], self._points[-1])
-            else:
-                v = self._three_point_tangent(self._points[-2], self._points[-1], self._points[0])
-        else:
-            if self._closed:
-                v = self._three_point_tangent(
-                    self._points[i - 1], self._points[i], self._points[(i + 1) % len(self._points)]
-                )
-            else:
-                if i == 0:
-                    v = self._two_point_tangent(self._points[0], self._points[1])
-                elif i == len(self._points) - 1:
-                    v = self._two_point_tangent(self._points[-2], self._points[-1])
-                else:
-                    v = self._three_point_tangent(
-                        self._points[i - 1], self._points[i], self._points[i + 1]
-                    )
-                
-        tagent_vector = self._transform(v)
-        return tagent_vector / np.linalg.norm(tagent_vector)
-
-    def copy(self) -> Shape:
-        polyline = Polyline(
-            self._points.copy(), 
-            self._closed, 
-            self._color_gradient.copy(), 
-            self._point_density
-        )
-        polyline._transformations = [t.copy() for t in self._transformations]
-        polyline._inverse_transformations = [t.copy() for t in self._inverse_transformations]
-        polyline._displacements = self._displacements
-        return polyline
-    
+        return self.tangents(np.array([s]))[0]
+
+    def tangents(self, s_values: np.ndarray) -> np.ndarray:
+        s_values = np.asarray(s_values, dtype=float).reshape(-1)
+        # the tangent at the vertex that starts the segment holding s; the end of an open
+        # polyline takes its last vertex, the end of a closed one is its first vertex again
+        vertices = self._find_line_segment_indices(s_values)
+        vertices = np.where(s_values >= 1.0, 0 if self._closed else len(self._points) - 1, vertices)
+        tangent_vectors = self._transform_directions(self._vertex_tangents()[vertices])
+        return tangent_vectors / np.linalg.norm(tangent_vectors, axis=1)[:, np.newaxis]
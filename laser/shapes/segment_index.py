@@ -0,0 +1,177 @@
+from __future__ import annotations
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Tuple
+
+
+class SegmentIndex:
+
+    MAX_PAIRS_PER_BATCH: int = 2 ** 20
+    FIRST_CANDIDATES: int = 4
+    LONG_SEGMENT_FACTOR: float = 4.0
+
+    _starts: np.ndarray
+    _ends: np.ndarray
+
+    _origin: np.ndarray
+    _extent: np.ndarray
+    _cell_size: float
+    _shape: Tuple[int, int]
+
+    _cell_offsets: np.ndarray
+    _cell_segments: np.ndarray
+    _row_offsets: np.ndarray
+    _row_segments: np.ndarray
+
+    _midpoint_tree: cKDTree
+    _tree_segments: np.ndarray
+    _tree_half_length: float
+    _long_segments: np.ndarray
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self._starts = starts
+        self._ends = ends
+
+        minimum = np.minimum(np.min(starts, axis=0), np.min(ends, axis=0))
+        maximum = np.maximum(np.max(starts, axis=0), np.max(ends, axis=0))
+        extent = max(float(np.max(maximum - minimum)), 1e-12)
+        # about one segment per cell for evenly spread segments
+        resolution = max(int(np.ceil(np.sqrt(len(starts)))), 1)
+        self._cell_size = extent / resolution
+        self._origin = minimum
+        self._extent = maximum - minimum
+        self._shape = tuple(np.maximum(np.ceil((maximum - minimum) / self._cell_size).astype(int), 1)[::-1])
+
+        segment_minimum = self._cells(np.minimum(starts, ends))
+        segment_maximum = self._cells(np.maximum(starts, ends))
+        segment_ids, cell_x, cell_y = self._expand_boxes(segment_minimum, segment_maximum)
+        self._cell_offsets, self._cell_segments = self._compressed(
+            cell_y * self._shape[1] + cell_x, segment_ids, self._shape[0] * self._shape[1]
+        )
+
+        rows = np.arange(len(starts))
+        row_counts = segment_maximum[:, 1] - segment_minimum[:, 1] + 1
+        row_segment_ids = np.repeat(rows, row_counts)
+        row_ids = np.repeat(segment_minimum[:, 1], row_counts) + self._ranges(row_counts)
+        self._row_offsets, self._row_segments = self._compressed(row_ids, row_segment_ids, self._shape[0])
+
+        # a few long segments would inflate every nearest-point search radius, so they
+        # are kept out of the midpoint tree
+        # zero-length segments from repeated vertices don't count towards the typical length
+        half_lengths = np.linalg.norm(ends - starts, axis=1) / 2
+        positive = half_lengths[half_lengths > 0.0]
+        is_long = half_lengths > self.LONG_SEGMENT_FACTOR * (np.median(positive) if len(positive) > 0 else 0.0)
+        if np.all(is_long):
+            is_long[:] = False
+        self._tree_segments = np.nonzero(~is_long)[0]
+        self._long_segments = np.nonzero(is_long)[0]
+        self._tree_half_length = float(np.max(half_lengths[self._tree_segments]))
+        self._midpoint_tree = cKDTree((starts[self._tree_segments] + ends[self._tree_segments]) / 2)
+
+    @staticmethod
+    def _ranges(counts: np.ndarray) -> np.ndarray:
+        # concatenation of arange(count) for every count
+        total = int(np.sum(counts))
+        return np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    @staticmethod
+    def _compressed(keys: np.ndarray, values: np.ndarray, n_keys: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(keys, kind='stable')
+        offsets = np.zeros(n_keys + 1, dtype=int)
+        np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+        return offsets, values[order]
+
+    def _cells(self, points: np.ndarray, clip: bool = True) -> np.ndarray:
+        cells = np.floor((points - self._origin) / self._cell_size).astype(int)
+        if clip:
+            return np.clip(cells, 0, np.array(self._shape[::-1]) - 1)
+        return cells
+
+    def _expand_boxes(self, minimum: np.ndarray, maximum: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        widths = maximum[:, 0] - minimum[:, 0] + 1
+        heights = maximum[:, 1] - minimum[:, 1] + 1
+        counts = widths * heights
+        box_ids = np.repeat(np.arange(len(minimum)), counts)
+        local = self._ranges(counts)
+        cell_x = minimum[box_ids, 0] + local % widths[box_ids]
+        cell_y = minimum[box_ids, 1] + local // widths[box_ids]
+        return box_ids, cell_x, cell_y
+
+    def _gather(self, offsets: np.ndarray, values: np.ndarray, keys: np.ndarray, owners: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        counts = offsets[keys + 1] - offsets[keys]
+        pair_owners = np.repeat(owners, counts)
+        pair_values = values[np.repeat(offsets[keys], counts) + self._ranges(counts)]
+        return pair_owners, pair_values
+
+    def box_candidates(self, minimum: np.ndarray, maximum: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return unique (box index, segment index) pairs of segments sharing a cell with each box.
+        """
+        overlaps = np.all((maximum >= self._origin) & (minimum <= self._origin + self._extent), axis=1)
+        boxes = np.nonzero(overlaps)[0]
+        box_ids, cell_x, cell_y = self._expand_boxes(self._cells(minimum[boxes]), self._cells(maximum[boxes]))
+        owners, segments = self._gather(self._cell_offsets, self._cell_segments, cell_y * self._shape[1] + cell_x, boxes[box_ids])
+        keys = np.unique(owners * len(self._starts) + segments)
+        return keys // len(self._starts), keys % len(self._starts)
+
+    def row_candidates(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (point index, segment index) pairs of segments whose cell rows contain each point.
+        """
+        rows = self._cells(points, clip=False)[:, 1]
+        inside = np.nonzero((rows >= 0) & (rows < self._shape[0]))[0]
+        return self._gather(self._row_offsets, self._row_segments, rows[inside], inside)
+
+    def nearest(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the nearest point on any segment and its distance for every point.
+        """
+        if len(points) == 0:
+            return np.empty((0, 2)), np.empty(0)
+
+        # the segments next to the nearest midpoints give an upper bound for the distance,
+        # and every segment that could beat it has its midpoint within the bound plus
+        # its half length; unusually long segments are always checked
+        n_first = min(self.FIRST_CANDIDATES, len(self._tree_segments))
+        _, first = self._midpoint_tree.query(points, k=n_first)
+        first = self._tree_segments[first.reshape(len(points), -1)]
+        owners = np.repeat(np.arange(len(points)), first.shape[1])
+        nearest_points, distances = self._nearest_among(points, owners, first.ravel(), len(points))
+
+        neighbourhoods = self._midpoint_tree.query_ball_point(points, distances + self._tree_half_length, return_sorted=False)
+        counts = np.fromiter(map(len, neighbourhoods), dtype=int, count=len(points))
+        owners = np.concatenate([np.repeat(np.arange(len(points)), counts), np.repeat(np.arange(len(points)), len(self._long_segments))])
+        segments = np.concatenate([
+            self._tree_segments[np.concatenate([np.asarray(n, dtype=int) for n in neighbourhoods])],
+            np.tile(self._long_segments, len(points))
+        ])
+        return self._nearest_among(points, owners, segments, len(points))
+
+    def _nearest_among(self, points: np.ndarray, owners: np.ndarray, segments: np.ndarray, n_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        nearest_points = np.empty((n_points, 2))
+        distances = np.full(n_points, np.inf)
+        order = np.argsort(owners, kind='stable')
+        owners, segments = owners[order], segments[order]
+        for batch in range(0, len(owners), self.MAX_PAIRS_PER_BATCH):
+            batch_owners = owners[batch:batch + self.MAX_PAIRS_PER_BATCH]
+            batch_segments = segments[batch:batch + self.MAX_PAIRS_PER_BATCH]
+            starts = self._starts[batch_segments]
+            deltas = self._ends[batch_segments] - starts
+            squared_lengths = np.sum(deltas ** 2, axis=1)
+            t = np.clip(np.sum((points[batch_owners] - starts) * deltas, axis=1) / np.where(squared_lengths > 0.0, squared_lengths, 1.0), 0.0, 1.0)
+            candidates = starts + t[:, np.newaxis] * deltas
+            candidate_distances = np.linalg.norm(points[batch_owners] - candidates, axis=1)
+
+            # pairs are grouped by owner, so the best candidate of each group is found with reduceat
+            group_starts = np.flatnonzero(np.concatenate([[True], batch_owners[1:] != batch_owners[:-1]]))
+            group_owners = batch_owners[group_starts]
+            minima = np.minimum.reduceat(candidate_distances, group_starts)
+            is_minimum = candidate_distances == np.repeat(minima, np.diff(np.append(group_starts, len(batch_owners))))
+            best = np.flatnonzero(is_minimum)
+            _, first_best = np.unique(batch_owners[best], return_index=True)
+            best = best[first_best]
+
+            improved = minima < distances[group_owners]
+            distances[group_owners[improved]] = minima[improved]
+            nearest_points[group_owners[improved]] = candidates[best[improved]]
+        return nearest_points, distances
@@ -1,31 +1,72 @@
 from __future__ import annotations
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import List, Generator, Tuple, Callable
+from typing import Dict, List, Tuple, Callable
 from skimage import measure
-from functools import cache
+import hashlib
 import warnings
 
 from laser.color import ColorGradient, Color
-from laser.render_line import RenderLine
-from util import np_hash, np_cache, ensure_np_array
+from laser.point_stream import PointStream
+from laser.sdf_cache import get_sdf_cache
+from laser.sample_cache import get_sample_cache
+from util import np_hash, ensure_np_array, memoize, memo_info, clear_memos, MemoInfo, MEMO_ATTRIBUTE
 
 
 Displacement = Callable[['Shape', np.ndarray, float, float], np.ndarray]
 
 
+class BatchedDisplacement(ABC):
+
+    @abstractmethod
+    def __call__(self, shape: Shape, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
+        raise NotImplementedError("@abstractmethod __call__")
+
+
+class PointwiseDisplacement(BatchedDisplacement):
+
+    _displacement: Displacement
+
+    def __init__(self, displacement: Displacement):
+        self._displacement = displacement
+
+    def __eq__(self, other: PointwiseDisplacement) -> bool:
+        if isinstance(other, PointwiseDisplacement):
+            return self._displacement == other._displacement
+        return self._displacement == other
+
+    def __hash__(self) -> int:
+        return hash(self._displacement)
+
+    def __call__(self, shape: Shape, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
+        return np.array([
+            self._displacement(shape, p, s, t)
+            for p, s in zip(points, s_values)
+        ], dtype=float).reshape(-1, 2)
+
+
 class Shape(ABC):
 
     ILDX_RESOLUTION: int = 2 ** 16
     NEEDED_COMBINATION_DENSITY: int = 300
     DEFAULT_POINT_DENSITY: float = 0.0005
 
+    COMBINATION_CACHE_VERSION: int = 1
+    ADAPTIVE_COMBINATION: bool = True
+    MAX_COMBINATION_DENSITY: int = 2048
+    MIN_COMBINATION_CELLS: int = 64
+    COMBINATION_OVERSAMPLING: float = 2.0
+    COMBINATION_REFINEMENT: int = 8
+
     _point_density: float | None
     _color_gradient: ColorGradient
 
-    _transformations: List[np.ndarray]
-    _inverse_transformations: List[np.ndarray]
-    _displacements: List[Displacement]
+    # geometry, matrices and both stacks are never modified in place, so copies share them
+    _transformations: Tuple[np.ndarray, ...]
+    _displacements: Tuple[BatchedDisplacement, ...]
+
+    _matrix: np.ndarray | None
+    _inverse_matrix: np.ndarray | None
 
     def __init__(
         self, 
@@ -35,9 +76,17 @@ class Shape(ABC):
         self._color_gradient = color_gradient
         self._point_density = point_density
 
-        self._transformations = []
-        self._inverse_transformations = []
-        self._displacements = []
+        self._transformations = ()
+        self._displacements = ()
+
+        self._matrix = None
+        self._inverse_matrix = None
+
+    def __getstate__(self) -> dict:
+        # memoized results are per process and rebuilt on demand
+        state = self.__dict__.copy()
+        state.pop(MEMO_ATTRIBUTE, None)
+        return state
 
     def __eq__(self, other: Shape) -> bool:
         if self._point_density != other._point_density:
@@ -61,57 +110,146 @@ class Shape(ABC):
             self._point_density,
             self._color_gradient,
             *(np_hash(transformation) for transformation in self._transformations),
-            tuple(self._displacements)
+            self._displacements
         ))
 
     @abstractmethod
-    def _compute_points(self) -> Tuple[List[np.ndarray], List[Color], List[float]]:
+    def _compute_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         raise NotImplementedError("@abstractmethod _compute_points")
 
-    @np_cache
+    def _geometry_key(self) -> bytes | None:
+        return None
+
+    def _sample_key(self) -> tuple | None:
+        geometry_key = self._geometry_key()
+        if geometry_key is None:
+            return None
+        return type(self).__qualname__, geometry_key, self._point_density, self._color_gradient.content_key()
+
+    def _sampled_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # local-space samples only depend on the geometry, so shapes rebuilt every frame
+        # with a different transform reuse them
+        key = self._sample_key()
+        sample_cache = get_sample_cache()
+        samples = sample_cache.get(key) if key is not None else None
+        if samples is None:
+            points, colors, s_s = self._compute_points()
+            samples = (np.asarray(points, dtype=float), np.asarray(colors, dtype=float), np.asarray(s_s, dtype=float))
+            if key is not None:
+                sample_cache.put(key, samples)
+        return samples
+
+    def content_hash(self) -> str | None:
+        geometry_key = self._geometry_key()
+        if geometry_key is None:
+            return None
+        content = hashlib.sha256()
+        content.update(type(self).__qualname__.encode())
+        content.update(geometry_key)
+        content.update(np.ascontiguousarray(self.matrix, dtype=float).tobytes())
+        content.update(repr(self._point_density).encode())
+        return content.hexdigest()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            matrix = np.identity(3)
+            for transformation in self._transformations:
+                matrix = transformation @ matrix
+            self._matrix = matrix
+        return self._matrix
+
+    @property
+    def inverse_matrix(self) -> np.ndarray:
+        if self._inverse_matrix is None:
+            if np.linalg.cond(self.matrix) < 1 / np.finfo(float).eps:
+                self._inverse_matrix = np.linalg.inv(self.matrix)
+            else:
+                # a singular matrix collapses the plane onto a line or point, and the pseudo-inverse
+                # maps every point to the least-squares preimage of its projection onto that image
+                self._inverse_matrix = np.linalg.pinv(self.matrix)
+                warnings.warn(
+                    "You used a non-invertable transformation matrix. The pseudo-inverse was used instead.",
+                    RuntimeWarning
+                )
+        return self._inverse_matrix
+
+    def _invalidate_matrices(self):
+        self._matrix = None
+        self._inverse_matrix = None
+        clear_memos(self)
+
+    def memo_info(self) -> Dict[str, MemoInfo]:
+        return memo_info(self)
+
+    def clear_memos(self):
+        clear_memos(self)
+
+    def _local_distance_scale(self) -> float | None:
+        """
+        Return an upper bound of local over world distances, or None for projective transformations.
+        """
+        if not np.allclose(self.matrix[2], [0.0, 0.0, 1.0]):
+            return None
+        return float(np.linalg.norm(self.inverse_matrix[:2, :2], 2))
+
+    @staticmethod
+    def _apply_matrix(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+        affine_coordinates = points @ matrix[:, :2].T + matrix[:, 2]
+        return affine_coordinates[..., :2] / affine_coordinates[..., 2:]
+
+    @memoize()
     def _transform(self, p: np.ndarray) -> np.ndarray:
-        affine_coordinates = np.array([p[0], p[1], 1])
-        for transformation in self._transformations:
-            affine_coordinates = np.dot(transformation, affine_coordinates)
-        return np.array([affine_coordinates[0], affine_coordinates[1]]) / affine_coordinates[2]
+        if not self._transformations:
+            return np.asarray(p, dtype=float)
+        return self._apply_matrix(self.matrix, p)
+
+    def _transform_directions(self, v: np.ndarray) -> np.ndarray:
+        if not self._transformations:
+            return np.asarray(v, dtype=float)
+        return np.asarray(v, dtype=float) @ self.matrix[:2, :2].T
 
-    @np_cache
+    @memoize()
     def _inv_transform(self, p: np.ndarray) -> np.ndarray:
-        affine_coordinates = np.array([p[0], p[1], 1])
-        for transformation in reversed(self._inverse_transformations):
-            affine_coordinates = np.dot(transformation, affine_coordinates)
-        return np.array([affine_coordinates[0], affine_coordinates[1]]) / affine_coordinates[2]
-
-    @np_cache
-    def _displace(self, p: np.ndarray, s: float, t: float) -> np.ndarray:
-        p_disp = p.copy()
+        if not self._transformations:
+            return np.asarray(p, dtype=float)
+        return self._apply_matrix(self.inverse_matrix, p)
+
+    @memoize()
+    def _displace(self, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
         for displacement in self._displacements:
-            p_disp = displacement(self, p_disp, s, t)
-        return p_disp
+            points = displacement(self, points, s_values, t)
+        return points
+
+    def _displace_point(self, p: np.ndarray, s: float, t: float) -> np.ndarray:
+        if not self._displacements:
+            return p
+        return self._displace(p[np.newaxis], np.array([s]), t)[0]
 
     @ensure_np_array
     def is_point_inside(self, p: np.ndarray) -> bool:
-        return self.signed_distance(p) <= 0
-
-    def get_render_lines(self, t: float) -> Generator[RenderLine, None, None]:
-        points, colors, s_s = self._compute_points()
-        points = [
-            self._displace(
-                self._transform(point), s, t
-            )
-            for point, s in zip(points, s_s)
-        ]
+        return bool(self.are_points_inside(p[np.newaxis])[0])
+
+    def are_points_inside(self, points: np.ndarray) -> np.ndarray:
+        return self.signed_distances(points) <= 0
+
+    def get_point_stream(self, t: float) -> PointStream:
+        points, colors, s_values = self._sampled_points()
+        points = self._transform(points)
+        if self._displacements and not points.flags.writeable:
+            # untransformed points are the read-only cached samples; displacements may modify in place
+            points = points.copy()
+        points = self._displace(points, s_values, t)
+
+        inside = np.all((points > -1) & (points < 1), axis=1)
+        return PointStream(points[inside], colors[inside], np.zeros(np.count_nonzero(inside), dtype=bool), s_values[inside])
 
-        filtered_points = []
-        filtered_colors = []
-        for p, c in zip(points, colors):
-            if p[0] <= -1 or p[0] >= 1 or p[1] <= -1 or p[1] >= 1:
-                continue
-            filtered_points.append(p)
-            filtered_colors.append(c)
+    def _encloses_area(self) -> bool:
+        return True
 
-        for p0, p1, color in zip(filtered_points[:-1], filtered_points[1:], filtered_colors):
-            yield RenderLine(p0, p1, color)
+    @abstractmethod
+    def _line_crossings(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError("@abstractmethod _line_crossings")
 
     @ensure_np_array
     @abstractmethod
@@ -124,14 +262,20 @@ class Shape(ABC):
         raise NotImplementedError("@abstractmethod _is_outside")
 
     @ensure_np_array
-    @abstractmethod
     def signed_distance(self, p: np.ndarray) -> float:
-        raise NotImplementedError("@abstractmethod signed_distance")
+        return self.signed_distances(p[np.newaxis])[0]
     
     @ensure_np_array
-    @abstractmethod
     def nearest_point(self, p: np.ndarray) -> np.ndarray:
-        raise NotImplementedError("@abstractmethod nearest_point")
+        return self.nearest_points(p[np.newaxis])[0]
+
+    @abstractmethod
+    def signed_distances(self, points: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("@abstractmethod signed_distances")
+
+    @abstractmethod
+    def nearest_points(self, points: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("@abstractmethod nearest_points")
     
     @ensure_np_array
     @abstractmethod
@@ -143,22 +287,41 @@ class Shape(ABC):
     def tangent(self, s: float) -> np.ndarray:
         raise NotImplementedError("@abstractmethod tangent")
 
-    @ensure_np_array
-    @abstractmethod
+    @staticmethod
+    def _frozen(array: np.ndarray) -> np.ndarray:
+        array = np.array(array, dtype=float)
+        array.flags.writeable = False
+        return array
+
     def copy(self) -> Shape:
-        raise NotImplementedError("@abstractmethod copy")
+        shape = object.__new__(type(self))
+        shape.__dict__.update(self.__dict__)
+        shape.__dict__.pop(MEMO_ATTRIBUTE, None)
+        shape._color_gradient = self._color_gradient.copy()
+        return shape
     
-    def normal(self, s: float, t: float) -> np.ndarray:
-        tangent = self.tangent(s, t)
+    def points_by_s(self, s_values: np.ndarray, t: float) -> np.ndarray:
+        return np.array([self.point_by_s(s, t) for s in np.asarray(s_values, dtype=float).reshape(-1)]).reshape(-1, 2)
+
+    def tangents(self, s_values: np.ndarray) -> np.ndarray:
+        return np.array([self.tangent(s) for s in np.asarray(s_values, dtype=float).reshape(-1)]).reshape(-1, 2)
+
+    def normal(self, s: float) -> np.ndarray:
+        tangent = self.tangent(s)
         return np.array([-tangent[1], tangent[0]])
+
+    def normals(self, s_values: np.ndarray) -> np.ndarray:
+        tangents = self.tangents(s_values)
+        return np.column_stack([-tangents[:, 1], tangents[:, 0]])
     
     def reset_transformations(self) -> Shape:
-        self._transformations = []
-        self._inverse_transformations = []
+        self._transformations = ()
+        self._invalidate_matrices()
         return self
 
     def reset_displacements(self) -> Shape:
-        self._displacements = []
+        self._displacements = ()
+        clear_memos(self)
         return self
     
     @ensure_np_array
@@ -224,22 +387,36 @@ class Shape(ABC):
 
     @ensure_np_array
     def transform(self, matrix: np.ndarray) -> Shape:
-        try:
-            inv_matrix = np.linalg.inv(matrix)
-        except np.linalg.LinAlgError:
-            inv_matrix = np.linalg.pinv(matrix)  # TODO: Check if this is correct
-            warnings.warn(
-                "You used a non-invertable transformation matrix. The pseudo-inverse was used instead.",
-                RuntimeWarning
-            )
-        self._transformations.append(matrix)
-        self._inverse_transformations.append(inv_matrix)
+        self._transformations = self._transformations + (self._frozen(matrix),)
+        self._invalidate_matrices()
         return self
 
-    def displace(self, func: Displacement) -> Shape:
-        self._displacements.append(func)
+    def displace(self, func: Displacement | BatchedDisplacement) -> Shape:
+        if not isinstance(func, BatchedDisplacement):
+            func = PointwiseDisplacement(func)
+        self._displacements = self._displacements + (func,)
+        clear_memos(self)
         return self
 
+    def bounding_box(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.array([-1.0, -1.0]), np.array([1.0, 1.0])
+
+    def _union_bounds(self, other: Shape, padding: float = 0.0) -> Tuple[float, float, float, float]:
+        minimum, maximum = self.bounding_box()
+        other_minimum, other_maximum = other.bounding_box()
+        minimum = np.minimum(minimum, other_minimum) - padding
+        maximum = np.maximum(maximum, other_maximum) + padding
+        return (*minimum.tolist(), *maximum.tolist())
+
+    def _intersection_bounds(self, other: Shape) -> Tuple[float, float, float, float]:
+        minimum, maximum = self.bounding_box()
+        other_minimum, other_maximum = other.bounding_box()
+        return (*np.maximum(minimum, other_minimum).tolist(), *np.minimum(maximum, other_maximum).tolist())
+
+    def _own_bounds(self) -> Tuple[float, float, float, float]:
+        minimum, maximum = self.bounding_box()
+        return (*minimum.tolist(), *maximum.tolist())
+
     @property
     def point_density(self) -> float | None:
         return self._point_density
@@ -249,69 +426,226 @@ class Shape(ABC):
         self._point_density = value
         
     def union(self, other: Shape, color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return np.minimum(self.signed_distance(p), other.signed_distance(p))
-        return self._combine_shapes(other, sdf, color_gradient)
+        def sdf(points: np.ndarray) -> np.ndarray:
+            return np.minimum(self.signed_distances(points), other.signed_distances(points))
+        return self._combine_shapes(other, sdf, color_gradient, bounds=self._union_bounds(other), cache_key=('union',))
 
     def smooth_union(self, other: Shape, k: float, color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return -np.log(np.exp(-k * self.signed_distance(p)) + np.exp(-k * other.signed_distance(p))) / k
-        return self._combine_shapes(other, sdf, color_gradient)
+        def sdf(points: np.ndarray) -> np.ndarray:
+            return -np.log(np.exp(-k * self.signed_distances(points)) + np.exp(-k * other.signed_distances(points))) / k
+        # the blend grows the union by at most log(2) / k
+        bounds = self._union_bounds(other, np.log(2) / k) if k > 0 else None
+        return self._combine_shapes(other, sdf, color_gradient, bounds=bounds, cache_key=('smooth_union', k))
 
     def intersection(self, other: Shape, color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return np.maximum(self.signed_distance(p), other.signed_distance(p))
-        return self._combine_shapes(other, sdf, color_gradient)
+        def sdf(points: np.ndarray) -> np.ndarray:
+            return np.maximum(self.signed_distances(points), other.signed_distances(points))
+        return self._combine_shapes(other, sdf, color_gradient, bounds=self._intersection_bounds(other), cache_key=('intersection',))
 
     def difference(self, other: Shape, color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return np.maximum(self.signed_distance(p), -other.signed_distance(p))
-        return self._combine_shapes(other, sdf, color_gradient)
+        def sdf(points: np.ndarray) -> np.ndarray:
+            return np.maximum(self.signed_distances(points), -other.signed_distances(points))
+        return self._combine_shapes(other, sdf, color_gradient, bounds=self._own_bounds(), cache_key=('difference',))
    
     def lerp(self, other: Shape, r: float, color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return (1 - r) * self.signed_distance(p) + r * other.signed_distance(p)
-        return self._combine_shapes(other, sdf, color_gradient)
+        def sdf(points: np.ndarray) -> np.ndarray:
+            return (1 - r) * self.signed_distances(points) + r * other.signed_distances(points)
+        bounds = self._union_bounds(other) if 0 <= r <= 1 else None
+        return self._combine_shapes(other, sdf, color_gradient, bounds=bounds, cache_key=('lerp', r))
     
-    def custom_sdf_operation(self, other: Shape, custom_sdf: Callable[[np.ndarray, np.ndarray], float], color_gradient: ColorGradient) -> List[Shape]:
-        def sdf(p: np.ndarray) -> float:
-            return custom_sdf(self.signed_distance(p), other.signed_distance(p) if other else None)
-        return self._combine_shapes(other, sdf, color_gradient)
-
-    @cache
-    def _combine_shapes(self, other: Shape, sdf: Callable[[np.ndarray], float], color_gradient: ColorGradient) -> List[Shape]:
-        from laser.shapes.polyline import Polyline
-        from laser.shapes.point import Point
-
+    def custom_sdf_operation(
+        self, 
+        other: Shape, 
+        custom_sdf: Callable[[np.ndarray, np.ndarray], float], 
+        color_gradient: ColorGradient,
+        batched: bool = False,
+        cache_key: str | None = None
+    ) -> List[Shape]:
+        def sdf(points: np.ndarray) -> np.ndarray:
+            distances = self.signed_distances(points)
+            other_distances = other.signed_distances(points) if other else [None] * len(points)
+            if batched:
+                return custom_sdf(distances, other_distances if other else None)
+            return np.array([custom_sdf(d, other_d) for d, other_d in zip(distances, other_distances)])
+        # custom functions can't be hashed by content, so they are only cached under a user given key
+        return self._combine_shapes(other, sdf, color_gradient, cache_key=None if cache_key is None else ('custom', cache_key))
+
+    def _combination_point_density(self, other: Shape | None) -> float:
         if other:
             if self._point_density is None and other._point_density is not None:
-                point_density = other._point_density
+                return other._point_density
             elif self._point_density is not None and other._point_density is None:
-                point_density = other._point_density
+                return self._point_density
             elif self._point_density is None and other._point_density is None:
-                point_density = self.DEFAULT_POINT_DENSITY
-            else:
-                point_density = max(self._point_density, other._point_density)
-        else:
-            if self._point_density is None:
-                point_density = self.DEFAULT_POINT_DENSITY
-            else:
-                point_density = self._point_density
+                return self.DEFAULT_POINT_DENSITY
+            return max(self._point_density, other._point_density)
+        if self._point_density is None:
+            return self.DEFAULT_POINT_DENSITY
+        return self._point_density
 
+    def _combination_distance_scale(self, other: Shape | None) -> float | None:
+        scales = [self._local_distance_scale()] + ([other._local_distance_scale()] if other else [])
+        if any(scale is None for scale in scales):
+            return None
+        return max(scales)
+
+    @staticmethod
+    def _evaluate_sdf(sdf: Callable[[np.ndarray], np.ndarray], points: np.ndarray, batched: bool) -> np.ndarray:
+        if batched:
+            return np.asarray(sdf(points), dtype=float).reshape(-1)
+        return np.array([sdf(np.array(p)) for p in points.tolist()], dtype=float)
+
+    def _dense_contours(
+        self,
+        sdf: Callable[[np.ndarray], np.ndarray],
+        batched: bool
+    ) -> Tuple[List[np.ndarray], float]:
         X, Y = np.meshgrid(np.linspace(-1, 1, self.NEEDED_COMBINATION_DENSITY), np.linspace(-1, 1, self.NEEDED_COMBINATION_DENSITY))
-        Z = np.array([sdf(np.array([x, y])) for x, y in zip(X.flatten(), Y.flatten())]).reshape(X.shape)
-        contours = measure.find_contours(Z, 0)
+        grid_points = np.column_stack([X.flatten(), Y.flatten()])
+        Z = self._evaluate_sdf(sdf, grid_points, batched).reshape(X.shape)
+        contours = [
+            contour[:, ::-1] / self.NEEDED_COMBINATION_DENSITY * 2 - 1
+            for contour in measure.find_contours(Z, 0)
+        ]
+        return contours, 2.0 / self.NEEDED_COMBINATION_DENSITY
+
+    def _adaptive_contours(
+        self,
+        sdf: Callable[[np.ndarray], np.ndarray],
+        batched: bool,
+        bounds: Tuple[float, float, float, float] | None,
+        spacing: float,
+        distance_scale: float = 1.0
+    ) -> Tuple[List[np.ndarray], float]:
+        if bounds is None:
+            bounds = (-1.0, -1.0, 1.0, 1.0)
+        minimum = np.maximum(np.array(bounds[:2]), -1.0)
+        maximum = np.minimum(np.array(bounds[2:]), 1.0)
+        if np.any(minimum > maximum):
+            return [], spacing
+
+        # fine cell size from the point spacing, never coarser than the dense grid
+        # and fine enough to resolve small operands
+        cell_size = min(
+            spacing / self.COMBINATION_OVERSAMPLING,
+            2.0 / self.NEEDED_COMBINATION_DENSITY,
+            max(np.max(maximum - minimum), 2.0 / self.MAX_COMBINATION_DENSITY) / self.MIN_COMBINATION_CELLS
+        )
+        cell_size = max(cell_size, 2.0 / self.MAX_COMBINATION_DENSITY)
+        refinement = self.COMBINATION_REFINEMENT
+        coarse_size = cell_size * refinement
+
+        # pad by one coarse cell so contours of the operands close inside the grid
+        origin = minimum - coarse_size
+        coarse_shape = (np.ceil((maximum + coarse_size - origin) / coarse_size).astype(int) + 1)[::-1]
+        coarse_y, coarse_x = np.indices(coarse_shape)
+        coarse_points = origin + coarse_size * np.column_stack([coarse_x.ravel(), coarse_y.ravel()])
+        coarse_values = self._evaluate_sdf(sdf, coarse_points, batched).reshape(coarse_shape)
+
+        # a coarse cell may hold part of the zero level set if its corners change sign
+        # or any corner lies closer to the contour than the cell diagonal; the operands
+        # measure distances in their local space, so the diagonal is scaled to match
+        corners = np.stack([
+            coarse_values[:-1, :-1], coarse_values[1:, :-1],
+            coarse_values[:-1, 1:], coarse_values[1:, 1:]
+        ])
+        band = (
+            (np.min(corners, axis=0) <= 0) & (np.max(corners, axis=0) >= 0)
+            | np.any(np.abs(corners) < coarse_size * np.sqrt(2) * distance_scale, axis=0)
+        )
+        dilated_band = band.copy()
+        dilated_band[1:] |= band[:-1]
+        dilated_band[:-1] |= band[1:]
+        dilated_band[:, 1:] |= dilated_band[:, :-1].copy()
+        dilated_band[:, :-1] |= dilated_band[:, 1:].copy()
+
+        fine_shape = tuple((np.array(coarse_shape) - 1) * refinement + 1)
+        nearest_coarse = (np.arange(max(fine_shape)) + refinement // 2) // refinement
+        Z = coarse_values[np.ix_(nearest_coarse[:fine_shape[0]], nearest_coarse[:fine_shape[1]])]
+
+        cells = np.repeat(np.repeat(dilated_band, refinement, axis=0), refinement, axis=1)
+        vertices = np.zeros(fine_shape, dtype=bool)
+        vertices[:-1, :-1] |= cells
+        vertices[1:, :-1] |= cells
+        vertices[:-1, 1:] |= cells
+        vertices[1:, 1:] |= cells
+        fine_y, fine_x = np.nonzero(vertices)
+        fine_points = origin + cell_size * np.column_stack([fine_x, fine_y])
+        Z[fine_y, fine_x] = self._evaluate_sdf(sdf, fine_points, batched)
+
+        contours = [origin + cell_size * contour[:, ::-1] for contour in measure.find_contours(Z, 0)]
+        return contours, cell_size
+
+    def _combination_cache_key(self, other: Shape | None, cache_key: tuple, point_density: float) -> str | None:
+        operand_hashes = [self.content_hash()] + ([other.content_hash()] if other else [])
+        if any(operand_hash is None for operand_hash in operand_hashes):
+            return None
+        key = hashlib.sha256()
+        key.update(repr((
+            self.COMBINATION_CACHE_VERSION,
+            cache_key,
+            point_density,
+            self.ADAPTIVE_COMBINATION,
+            self.NEEDED_COMBINATION_DENSITY,
+            self.MAX_COMBINATION_DENSITY,
+            self.MIN_COMBINATION_CELLS,
+            self.COMBINATION_OVERSAMPLING,
+            self.COMBINATION_REFINEMENT
+        )).encode())
+        for operand_hash in operand_hashes:
+            key.update(operand_hash.encode())
+        return key.hexdigest()
+
+    def _compute_combination(
+        self,
+        sdf: Callable[[np.ndarray], np.ndarray],
+        batched: bool,
+        bounds: Tuple[float, float, float, float] | None,
+        point_density: float,
+        distance_scale: float | None = 1.0
+    ) -> List[Tuple[np.ndarray, bool]]:
+        spacing = 1.0 / (point_density * self.ILDX_RESOLUTION)
+
+        # without a bound on the operands' distance scale the band can't be trusted
+        if self.ADAPTIVE_COMBINATION and distance_scale is not None:
+            contours, cell_size = self._adaptive_contours(sdf, batched, bounds, spacing, distance_scale)
+            step = max(int(spacing / cell_size), 1)
+        else:
+            contours, cell_size = self._dense_contours(sdf, batched)
+            step = max(int(self.NEEDED_COMBINATION_DENSITY / (point_density * self.ILDX_RESOLUTION)), 1)
 
-        polylines = []
-        for contour in contours:
-            points = contour[:, ::-1] / self.NEEDED_COMBINATION_DENSITY * 2 - 1
-            sampled_points = points[::max(int(self.NEEDED_COMBINATION_DENSITY / (point_density * self.ILDX_RESOLUTION)), 1)]
+        combination = []
+        for points in sorted(contours, key=len, reverse=True):
             if len(points) > 1:
-                is_closed = np.allclose(points[0], points[-1])
-                polylines.append((Polyline(sampled_points, is_closed, color_gradient, point_density), len(points)))
+                combination.append((points[::step], bool(np.allclose(points[0], points[-1]))))
             elif len(points) == 1:
-                polylines.append((Point(points[0], color_gradient), len(points)))
+                combination.append((points, False))
+        return combination
+
+    def _combine_shapes(
+        self, 
+        other: Shape, 
+        sdf: Callable[[np.ndarray], np.ndarray], 
+        color_gradient: ColorGradient, 
+        batched: bool = True,
+        bounds: Tuple[float, float, float, float] | None = None,
+        cache_key: tuple | None = None
+    ) -> List[Shape]:
+        from laser.shapes.polyline import Polyline
+        from laser.shapes.point import Point
 
-        polylines.sort(key=lambda x: x[1], reverse=True)
+        point_density = self._combination_point_density(other)
 
-        return [polyline for polyline, _ in polylines]
+        # only the contours are cached, the shapes are rebuilt with the requested gradient
+        key = None if cache_key is None else self._combination_cache_key(other, cache_key, point_density)
+        combination = None if key is None else get_sdf_cache().get(key)
+        if combination is None:
+            combination = self._compute_combination(sdf, batched, bounds, point_density, self._combination_distance_scale(other))
+            if key is not None:
+                get_sdf_cache().put(key, combination)
+
+        return [
+            Polyline(points, is_closed, color_gradient, point_density) if len(points) > 1
+            else Point(points[0].copy(), color_gradient)
+            for points, is_closed in combination
+        ]
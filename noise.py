@@ -1,9 +1,44 @@
 from abc import ABC, abstractmethod
 import opensimplex
+from opensimplex.internals import _noise2, _noise3, _noise4
 from random import randint
 import numpy as np
 from util import ensure_np_array
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _noise2_points(coordinates: np.ndarray, perm: np.ndarray, perm_grad_index3: np.ndarray) -> np.ndarray:
+    values = np.empty(len(coordinates))
+    for i in range(len(coordinates)):
+        values[i] = _noise2(coordinates[i, 0], coordinates[i, 1], perm)
+    return values
+
+
+def _noise3_points(coordinates: np.ndarray, perm: np.ndarray, perm_grad_index3: np.ndarray) -> np.ndarray:
+    values = np.empty(len(coordinates))
+    for i in range(len(coordinates)):
+        values[i] = _noise3(coordinates[i, 0], coordinates[i, 1], coordinates[i, 2], perm, perm_grad_index3)
+    return values
+
+
+def _noise4_points(coordinates: np.ndarray, perm: np.ndarray, perm_grad_index3: np.ndarray) -> np.ndarray:
+    values = np.empty(len(coordinates))
+    for i in range(len(coordinates)):
+        values[i] = _noise4(coordinates[i, 0], coordinates[i, 1], coordinates[i, 2], coordinates[i, 3], perm)
+    return values
+
+
+# opensimplex compiles its per-point kernels with numba when it is installed, so the loops
+# over scattered points are compiled along with them; otherwise they run point by point
+if njit is not None:
+    _noise2_points = njit(cache=True)(_noise2_points)
+    _noise3_points = njit(cache=True)(_noise3_points)
+    _noise4_points = njit(cache=True)(_noise4_points)
+
 
 class Noise(ABC):
 
@@ -11,6 +46,8 @@ class Noise(ABC):
     _amplitude: float
     _n_wrapped_dimensions: int
     _radii: np.ndarray
+    _seed: int
+    _generator: opensimplex.OpenSimplex
     
     @ensure_np_array
     def __init__(
@@ -39,16 +76,46 @@ class Noise(ABC):
 
         if seed is None:
             seed = randint(0, 2 ** 64 - 1)
-        opensimplex.seed(seed)
+        self._seed = seed
+        self._generator = opensimplex.OpenSimplex(seed)
 
-    @ensure_np_array
     @abstractmethod
+    def _map_coordinates(self, points: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("@abstractmethod _map_coordinates")
+
+    def get_values(self, points: np.ndarray) -> np.ndarray:
+        coordinates = self._map_coordinates(np.asarray(points, dtype=float).reshape(-1, self.N_DIMENSIONS))
+        if njit is None:
+            if coordinates.shape[1] == 2:
+                noise = self._generator.noise2
+            elif coordinates.shape[1] == 3:
+                noise = self._generator.noise3
+            else:
+                noise = self._generator.noise4
+            values = np.fromiter((noise(*c) for c in coordinates.tolist()), dtype=float, count=len(coordinates))
+        else:
+            if coordinates.shape[1] == 2:
+                noise_points = _noise2_points
+            elif coordinates.shape[1] == 3:
+                noise_points = _noise3_points
+            else:
+                noise_points = _noise4_points
+            values = noise_points(np.ascontiguousarray(coordinates), self._generator._perm, self._generator._perm_grad_index3)
+        return self._amplitude * values
+
+    @ensure_np_array
     def get_value(self, p: np.ndarray) -> float:
-        raise NotImplementedError("@abstractmethod get_value")
+        return self.get_values(p[np.newaxis])[0]
     
     @ensure_np_array
-    def __call__(self, p: np.ndarray) -> float:
+    def __call__(self, p: np.ndarray) -> float | np.ndarray:
+        if p.ndim == 2:
+            return self.get_values(p)
         return self.get_value(p)
+
+    @property
+    def seed(self) -> int:
+        return self._seed
          
 
 class Noise1D(Noise):
@@ -77,25 +144,22 @@ class Noise1D(Noise):
     ):
         super().__init__(frequency, amplitude, n_wrapped_dimensions, radii, seed)
 
-    @ensure_np_array
-    def get_value(self, p: np.ndarray) -> float:
+    def _map_coordinates(self, points: np.ndarray) -> np.ndarray:
         if self._n_wrapped_dimensions == 0:  # line
-            x = p[0] * self._frequency[0]
-            y = 0
+            x = points[:, 0] * self._frequency[0]
+            y = np.zeros(len(points))
         elif self._n_wrapped_dimensions == 1:  # circle
-            x = np.cos(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-            y = np.sin(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-
-        v = opensimplex.noise2(x, y)
-        return self._amplitude * v
+            x = np.cos(points[:, 0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
+            y = np.sin(points[:, 0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
+        return np.column_stack([x, y])
 
 class Noise2D(Noise):
 
     N_DIMENSIONS: int = 2
     MAX_N_WRAPPED_DIMENSIONS: int = 2
 
-    @ensure_np_array
     @classmethod
+    @ensure_np_array
     def plane(cls, frequency: np.ndarray = np.array([1.0, 1.0]), amplitude: float = 1.0, radii: np.ndarray = np.array([]), seed: int | None = None):
         return cls(frequency, amplitude, 0, radii, seed)
     
@@ -120,24 +184,21 @@ class Noise2D(Noise):
     ):
         super().__init__(frequency, amplitude, n_wrapped_dimensions, radii, seed)
 
-    @ensure_np_array
-    def get_value(self, p: np.ndarray) -> float:
+    def _map_coordinates(self, points: np.ndarray) -> np.ndarray:
         if self._n_wrapped_dimensions == 0:  # plane
-            x = p[0] * self._frequency[0]
-            y = p[1] * self._frequency[1]
-            v = opensimplex.noise2(x, y)
-        elif self._n_wrapped_dimensions == 1:  # cylinder
-            x = np.cos(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-            y = np.sin(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-            z = p[1] * self._frequency[1]
-            v = opensimplex.noise3(x, y, z)
+            return points * self._frequency
+        
+        u = points[:, 0] * self._frequency[0] * np.pi * 2.0
+        if self._n_wrapped_dimensions == 1:  # cylinder
+            x = np.cos(u) * self._radii[0]
+            y = np.sin(u) * self._radii[0]
+            z = points[:, 1] * self._frequency[1]
         elif self._n_wrapped_dimensions == 2:  # torus
-            x = (1 + np.cos(p[0] * self._frequency[0] * np.pi * 2.0)) * np.cos(p[1] * self._frequency[1] * np.pi * 2.0) * self._radii[0]
-            y = (1 + np.cos(p[0] * self._frequency[0] * np.pi * 2.0)) * np.sin(p[1] * self._frequency[1] * np.pi * 2.0) * self._radii[0]
-            z = np.sin(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[1]
-            v = opensimplex.noise3(x, y, z)
-
-        return self._amplitude * v
+            v = points[:, 1] * self._frequency[1] * np.pi * 2.0
+            x = (1 + np.cos(u)) * np.cos(v) * self._radii[0]
+            y = (1 + np.cos(u)) * np.sin(v) * self._radii[0]
+            z = np.sin(u) * self._radii[1]
+        return np.column_stack([x, y, z])
 
 
 class Noise3D(Noise):
@@ -171,27 +232,22 @@ class Noise3D(Noise):
     ):
         super().__init__(frequency, amplitude, n_wrapped_dimensions, radii, seed)
 
-    @ensure_np_array
-    def get_value(self, p: np.ndarray) -> float:
+    def _map_coordinates(self, points: np.ndarray) -> np.ndarray:
         if self._n_wrapped_dimensions == 0:  # space
-            x = p[0] * self._frequency[0]
-            y = p[1] * self._frequency[1]
-            z = p[2] * self._frequency[2]
-            v = opensimplex.noise3(x, y, z)
-        elif self._n_wrapped_dimensions == 1:  # cylindrical
-            x = np.cos(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-            y = np.sin(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[0]
-            z = p[1] * self._frequency[1]
-            w = p[2] * self._frequency[2]
-            v = opensimplex.noise4(x, y, z, w)
+            return points * self._frequency
+        
+        u = points[:, 0] * self._frequency[0] * np.pi * 2.0
+        if self._n_wrapped_dimensions == 1:  # cylindrical
+            x = np.cos(u) * self._radii[0]
+            y = np.sin(u) * self._radii[0]
+            z = points[:, 1] * self._frequency[1]
         elif self._n_wrapped_dimensions == 2:  # toroidal
-            x = (1 + np.cos(p[0] * self._frequency[0] * np.pi * 2.0)) * np.cos(p[1] * self._frequency[1] * np.pi * 2.0) * self._radii[0]
-            y = (1 + np.cos(p[0] * self._frequency[0] * np.pi * 2.0)) * np.sin(p[1] * self._frequency[1] * np.pi * 2.0) * self._radii[0]
-            z = np.sin(p[0] * self._frequency[0] * np.pi * 2.0) * self._radii[1]
-            w = p[2] * self._frequency[2]
-            v = opensimplex.noise4(x, y, z, w)
-
-        return self._amplitude * v
+            v = points[:, 1] * self._frequency[1] * np.pi * 2.0
+            x = (1 + np.cos(u)) * np.cos(v) * self._radii[0]
+            y = (1 + np.cos(u)) * np.sin(v) * self._radii[0]
+            z = np.sin(u) * self._radii[1]
+        w = points[:, 2] * self._frequency[2]
+        return np.column_stack([x, y, z, w])
     
 
 class Noise4D(Noise):
@@ -215,12 +271,7 @@ class Noise4D(Noise):
     ):
         super().__init__(frequency, amplitude, n_wrapped_dimensions, radii, seed)
     
-    @ensure_np_array
-    def get_value(self, p: np.ndarray) -> float:
-        x = p[0] * self._frequency[0]
-        y = p[1] * self._frequency[1]
-        z = p[2] * self._frequency[2]
-        w = p[3] * self._frequency[3]
-        v = opensimplex.noise4(x, y, z, w)
-        return self._amplitude * v
+    def _map_coordinates(self, points: np.ndarray) -> np.ndarray:
+        return points * self._frequency
+
     
\ No newline at end of file
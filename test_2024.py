@@ -5,7 +5,7 @@ from factory import Factory, IldxFrame, DmxFrame
 from noise import Noise3D
 
 from laser.color import Color, ColorGradient
-from laser.shapes import Star, Shape
+from laser.shapes import Star, Shape, BatchedDisplacement
 
 from dmx.fixture import Fixture
 
@@ -16,13 +16,14 @@ with open("dmx/fixtures/lixada_rgbw_leds.json", 'r') as f:
     lamp2 = Fixture.from_dict(json.load(f), 1 + len(lamp1))
 
 
-class StarNoise:
+class StarNoise(BatchedDisplacement):
 
     def __init__(self):
         self.noise = Noise3D.toroidal(amplitude = 0.1)
 
-    def __call__(self, shape: Shape, p: np.ndarray, s: float, t: float) -> np.ndarray:
-        return p + self.noise.get_value([p[0], p[1], t])
+    def __call__(self, shape: Shape, points: np.ndarray, s_values: np.ndarray, t: float) -> np.ndarray:
+        values = self.noise.get_values(np.column_stack([points, np.full(len(points), t)]))
+        return points + values[:, np.newaxis]
 
 
 def factory_function(ildx_frame: IldxFrame, dmx_frame: DmxFrame):
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from laser.color import Color, ColorGradient
+from laser.exclusion_zones import ExclusionZones
+from laser.point_stream import PointStream
+from laser.shapes import Circle, Line, Polygon
+
+
+@pytest.mark.parametrize("scale", [0.5, 0.2, 0.1])
+def test_baked_scaled_open_zone_matches_exact(scale):
+    color_gradient = ColorGradient(Color(1, 0, 0))
+    zone = Line(np.array([-1.0, 0.0]), np.array([1.0, 0.0]), color_gradient).scale([scale, scale]).translate([0.1, 0.2])
+    exact = ExclusionZones([(zone, True)])
+    baked = ExclusionZones([(zone, True)])
+    baked.bake(256)
+
+    for radius in np.linspace(0.05, 0.9, 30):
+        stream = Circle(np.array([0.1, 0.2 + 0.013 * radius]), radius, color_gradient, 0.003).get_point_stream(0)
+        expected, actual = exact.apply(stream.copy()), baked.apply(stream.copy())
+        assert len(expected) == len(actual)
+        assert np.array_equal(expected.blanked, actual.blanked)
+
+
+def crossing_stream(y: float) -> PointStream:
+    # short vertical strokes over the zone, joined by blanked jumps
+    xs = np.repeat(np.linspace(-0.7, 0.7, 40), 2)
+    ys = np.tile([y - 0.004, y + 0.004], 40)
+    points = np.column_stack([xs, ys])
+    blanked = np.tile([True, False], 40)
+    return PointStream(points, np.ones((len(points), 3)), blanked, np.linspace(0, 1, len(points)))
+
+
+def assert_baked_matches_exact(zones, stream):
+    exact = ExclusionZones(zones)
+    baked = ExclusionZones(zones)
+    baked.bake(256)
+    expected, actual = exact.apply(stream.copy()), baked.apply(stream.copy())
+    assert np.count_nonzero(expected.blanked) > np.count_nonzero(stream.blanked)
+    assert len(expected) == len(actual)
+    assert np.array_equal(expected.blanked, actual.blanked)
+
+
+def test_baked_overlapping_open_zones_match_exact():
+    color_gradient = ColorGradient(Color(1, 0, 0))
+    zones = [
+        (Line(np.array([-0.8, 0.0]), np.array([0.8, 0.0]), color_gradient), True),
+        (Line(np.array([-0.9, -0.9]), np.array([0.9, 0.9]), color_gradient), True),
+        (Line(np.array([-0.9, 0.9]), np.array([0.9, -0.9]), color_gradient), True)
+    ]
+    assert_baked_matches_exact(zones, crossing_stream(0.0))
+
+
+def test_baked_zone_thinner_than_a_cell_matches_exact():
+    color_gradient = ColorGradient(Color(1, 0, 0))
+    strip = Polygon([np.array([-0.5, 0.1]), np.array([0.5, 0.1]), np.array([0.5, 0.103]), np.array([-0.5, 0.103])], color_gradient)
+    assert_baked_matches_exact([(strip, True)], crossing_stream(0.1015))
@@ -0,0 +1,36 @@
+import numpy as np
+
+from laser.color import Color, ColorGradient
+from laser.ildx import ILDX_FORMAT_CODE_2D_INDEXED, ILDX_FORMAT_CODE_COLOR_PALETTE, IldxHeader, PALETTE_DTYPE, RECORD_DTYPES
+import laser.ildx_factory
+from laser.ildx_factory import IldxFactory
+from laser.shapes import Circle
+
+
+def draw_circle(frame):
+    frame += Circle(np.array([0.0, 0.0]), 0.2, ColorGradient(Color(0, 0, 1)))
+
+
+def test_indexed_file_starts_with_its_palette(tmp_path, monkeypatch):
+    monkeypatch.setattr(laser.ildx_factory, "cpu_count", lambda: 2)
+    palette = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    filename = str(tmp_path / "indexed.ildx")
+    IldxFactory(
+        10, 0, 0.2, draw_circle, filename, 0.01,
+        format_code=ILDX_FORMAT_CODE_2D_INDEXED, palette=palette, streaming=True
+    ).run()
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    header_size = len(bytes(IldxHeader()))
+    header = IldxHeader.from_buffer_copy(data[:header_size])
+    assert header.formatCode == ILDX_FORMAT_CODE_COLOR_PALETTE
+    assert header.numberOfRecords == len(palette)
+    colors = np.frombuffer(data[header_size:header_size + len(palette) * PALETTE_DTYPE.itemsize], dtype=PALETTE_DTYPE)
+    assert colors.tolist() == [(255, 0, 0), (0, 0, 255)]
+
+    offset = header_size + len(palette) * PALETTE_DTYPE.itemsize
+    frame_header = IldxHeader.from_buffer_copy(data[offset:offset + header_size])
+    assert frame_header.formatCode == ILDX_FORMAT_CODE_2D_INDEXED
+    records = np.frombuffer(data[offset + header_size:], dtype=RECORD_DTYPES[ILDX_FORMAT_CODE_2D_INDEXED], count=frame_header.numberOfRecords)
+    assert np.all(records['colorIndex'] == 1)
@@ -0,0 +1,13 @@
+from laser.sample_cache import SampleCacheReport
+
+
+def test_report_keeps_the_latest_counters_of_each_worker():
+    report = SampleCacheReport()
+    report.update((2, 3, 1))
+    report.update((1, 0, 2))
+    report.update((2, 1, 1))
+    report.update((1, 6, 2))
+    assert report.lines() == [
+        "Sample cache of worker 1: 6/8 hits (75.0%)",
+        "Sample cache of worker 2: 3/4 hits (75.0%)"
+    ]
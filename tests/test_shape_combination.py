@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from laser.color import Color, ColorGradient
+from laser.sdf_cache import configure_sdf_cache
+from laser.shapes import Circle, Shape
+
+
+@pytest.fixture(autouse=True)
+def empty_sdf_cache():
+    configure_sdf_cache()
+
+
+@pytest.mark.parametrize("scale", [0.2, 0.1, 0.05])
+@pytest.mark.parametrize("translation", [[0.7, 0.0], [-0.6, 0.63], [0.0, -0.85]])
+def test_adaptive_union_keeps_scaled_operand(monkeypatch, scale, translation):
+    color_gradient = ColorGradient(Color(1, 0, 0))
+
+    def union() -> int:
+        configure_sdf_cache()
+        small = Circle([0.0, 0.0], 0.1, color_gradient).scale([scale, scale]).translate(translation)
+        return len(Circle([0.0, 0.0], 0.4, color_gradient).union(small, color_gradient))
+
+    adaptive = union()
+    monkeypatch.setattr(Shape, 'ADAPTIVE_COMBINATION', False)
+    dense = union()
+    assert adaptive == dense == 2
@@ -0,0 +1,22 @@
+import numpy as np
+
+from laser.color import Color, ColorGradient
+from laser.shapes import Circle
+from laser.shapes.shape import BatchedDisplacement
+
+
+class InPlaceShift(BatchedDisplacement):
+
+    def __call__(self, shape, points, s_values, t):
+        points += 0.1
+        return points
+
+
+def test_in_place_displacement_of_untransformed_shape():
+    color_gradient = ColorGradient(Color(1, 0, 0))
+    reference = Circle(np.array([0.0, 0.0]), 0.5, color_gradient, 0.01).get_point_stream(0)
+
+    for _ in range(2):
+        circle = Circle(np.array([0.0, 0.0]), 0.5, color_gradient, 0.01).displace(InPlaceShift())
+        stream = circle.get_point_stream(0)
+        assert np.allclose(stream.points, reference.points + 0.1)
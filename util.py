@@ -1,45 +1,162 @@
 import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import Executor
 from functools import wraps
-from typing import get_type_hints
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, NamedTuple, Tuple, get_type_hints
 
 
 def np_hash(a: np.ndarray) -> int:
     return hash(a.tobytes())
 
 
-def np_as_key(a: np.ndarray) -> tuple:
-    return tuple(a.flatten())
+class MemoInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
 
 
-def np_cache(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        key = tuple((np_as_key(a) if isinstance(a, np.ndarray) else a for a in args))
-        if kwargs:
-            key += tuple([np_as_key(a) if isinstance(a, np.ndarray) else a for a in kwargs.values()])
-        if key in wrapper.cache:
-            return wrapper.cache[key]
-        result = func(*args, **kwargs)
-        wrapper.cache[key] = result
-        return result
-
-    wrapper.cache = {}
-    return wrapper
+class LruMemo:
+
+    _maxsize: int
+    _entries: OrderedDict
+    _hits: int
+    _misses: int
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, self._entries[key]
+        self._misses += 1
+        return False, None
+
+    def store(self, key: Hashable, value: Any):
+        self._entries[key] = value
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def info(self) -> MemoInfo:
+        return MemoInfo(self._hits, self._misses, self._maxsize, len(self._entries))
+
+
+MEMO_ATTRIBUTE: str = "_memos"
+
+
+def _memo_key_part(value: Any) -> Hashable:
+    if isinstance(value, np.ndarray):
+        return value.dtype.str, value.shape, value.tobytes()
+    hash(value)
+    return value
+
+
+def _copied(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copied(v) for v in value)
+    return value
+
+
+def memoize(maxsize: int = 128, max_key_bytes: int = 4096):
+    """
+    Bounded LRU memoization of a method, stored on the instance it is called on.
+    Array arguments are keyed by their bytes; calls with larger arrays than
+    max_key_bytes are not memoized. Callers get their own copy of memoized arrays.
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if any(isinstance(a, np.ndarray) and a.nbytes > max_key_bytes for a in (*args, *kwargs.values())):
+                return func(self, *args, **kwargs)
+            try:
+                key = tuple(_memo_key_part(a) for a in args)
+                if kwargs:
+                    key += tuple((k, _memo_key_part(v)) for k, v in sorted(kwargs.items()))
+            except TypeError:
+                return func(self, *args, **kwargs)
+
+            memos = self.__dict__.get(MEMO_ATTRIBUTE)
+            if memos is None:
+                memos = self.__dict__[MEMO_ATTRIBUTE] = {}
+            memo = memos.get(name)
+            if memo is None:
+                memo = memos[name] = LruMemo(maxsize)
+
+            found, result = memo.lookup(key)
+            if not found:
+                result = func(self, *args, **kwargs)
+                memo.store(key, _copied(result))
+                return result
+            return _copied(result)
+
+        return wrapper
+    return decorator
+
+
+def memo_info(instance: Any) -> Dict[str, MemoInfo]:
+    return {name: memo.info() for name, memo in instance.__dict__.get(MEMO_ATTRIBUTE, {}).items()}
+
+
+def clear_memos(instance: Any):
+    for memo in instance.__dict__.get(MEMO_ATTRIBUTE, {}).values():
+        memo.clear()
+
+
+def _array_parameters(func) -> Tuple[Tuple[int, ...], frozenset]:
+    type_hints = get_type_hints(func)
+    arg_names = func.__code__.co_varnames[:func.__code__.co_argcount]
+    names = frozenset(name for name, hint in type_hints.items() if hint is np.ndarray and name != 'return')
+    return tuple(i for i, name in enumerate(arg_names) if name in names), names
 
 
 def ensure_np_array(func):
+    # type hints may refer to classes defined after the decorated function, so the
+    # conversion plan is resolved on the first call and reused afterwards
+    plan = None
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        type_hints = get_type_hints(func)
-        arg_names = func.__code__.co_varnames[:func.__code__.co_argcount]
-        new_args = [
-            np.array(arg) if arg_name in type_hints and type_hints[arg_name] is np.ndarray and isinstance(arg, list)
-            else arg
-            for arg, arg_name in zip(args, arg_names)
-        ]
-        new_kwargs = {
-            k: (np.array(v) if k in type_hints and type_hints[k] is np.ndarray and isinstance(v, list) else v)
-            for k, v in kwargs.items()
-        }
-        return func(*new_args, **new_kwargs)
+        nonlocal plan
+        if plan is None:
+            plan = _array_parameters(func)
+        positions, names = plan
+        if not names:
+            return func(*args, **kwargs)
+
+        if any(i < len(args) and isinstance(args[i], list) for i in positions):
+            args = list(args)
+            for i in positions:
+                if i < len(args) and isinstance(args[i], list):
+                    args[i] = np.array(args[i])
+        if kwargs:
+            for name, value in kwargs.items():
+                if name in names and isinstance(value, list):
+                    kwargs[name] = np.array(value)
+        return func(*args, **kwargs)
     return wrapper
+
+
+def ordered_bounded_map(executor: Executor, func: Callable, *iterables: Iterable, window: int) -> Iterator[Any]:
+    """
+    Like Executor.map, but with at most window tasks submitted and not yet consumed,
+    so results are yielded in order without queueing every task up front.
+    """
+    pending = deque()
+    for args in zip(*iterables):
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()